@@ -0,0 +1 @@
+from tests.conftest import configuration  # noqa: F401
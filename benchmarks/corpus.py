@@ -0,0 +1,168 @@
+#!/usr/bin/python
+"""
+Corpus:
+------
+
+Deterministic synthetic inputs shaped like World Bank API responses for the
+benchmarks. Indicator names follow the patterns of real World Development
+Indicators names so that get_unit takes its usual paths.
+
+"""
+
+import json
+from random import Random
+
+subjects = (
+    "GDP",
+    "GNI",
+    "Population",
+    "School enrollment, primary",
+    "Mortality rate, under-5",
+    "Access to electricity",
+    "CO2 emissions",
+    "Foreign direct investment, net inflows",
+    "Households and NPISHs final consumption expenditure",
+    "Literacy rate, adult total",
+    "Prevalence of undernourishment",
+    "Renewable energy consumption",
+    "Unemployment, youth total",
+    "Military expenditure",
+    "Agricultural land",
+)
+templates = (
+    "{} (current US$)",
+    "{} per capita (constant 2015 US$)",
+    "{} (% of GDP)",
+    "{}, female (% of female population ages 15-24)",
+    "{} (per 1,000 live births)",
+    "{}, total",
+    "{} (annual % growth)",
+    "Number of {} recipients",
+    "Coverage: {} in poorest quintile (%)",
+    "{} (kt)",
+    "{}, male (modeled ILO estimate)",
+    "{} (people per sq. km of land area)",
+    "{} at $2.15 a day (2017 PPP) (% of population)",
+    "{}: Q1 (lowest) percentage",
+    "{} (15-24)",
+)
+variants = ("", " rural", " urban", ", male", ", female", " (2010)", " index")
+
+
+def get_indicator_names(number=1500):
+    names = []
+    for template in templates:
+        for subject in subjects:
+            for variant in variants:
+                names.append(template.format(f"{subject}{variant}"))
+    return names[:number]
+
+
+def get_indicator_list(number, seed=0):
+    """Indicators as returned by the topic indicators endpoint"""
+    random = Random(seed)
+    names = get_indicator_names()
+    indicators = []
+    for i in range(number):
+        parts = [random.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") * 2 for _ in range(2)]
+        parts.append(str(i))
+        if random.random() < 0.5:
+            parts.append(random.choice(("ZS", "CD", "KD.ZG", "TOTL.IN")))
+        indicators.append({"id": ".".join(parts), "name": names[i % len(names)]})
+    return indicators
+
+
+def get_observations(indicator_list, years, seed=0):
+    """Observations by indicator code as returned by the country indicator
+    endpoint"""
+    random = Random(seed)
+    observations = {}
+    for indicator in indicator_list:
+        code = indicator["id"]
+        indicator_observations = []
+        for year in years:
+            if random.random() < 0.1:
+                value = None
+            else:
+                value = round(random.uniform(0, 1000000), 3)
+            indicator_observations.append(
+                {
+                    "indicator": {"id": code, "value": indicator["name"]},
+                    "country": {"id": "AF", "value": "Afghanistan"},
+                    "countryiso3code": "AFG",
+                    "date": str(year),
+                    "value": value,
+                    "unit": "",
+                    "obs_status": "",
+                    "decimal": 1,
+                }
+            )
+        observations[code] = indicator_observations
+    return observations
+
+
+class Response:
+    def __init__(self, json):
+        self.data = json
+
+    def json(self):
+        return self.data
+
+
+class Download:
+    """Returns observations for the indicators in the request URL"""
+
+    def __init__(self, observations):
+        self.observations = observations
+
+    def download(self, url):
+        codes = url.split("/indicator/")[1].split("?")[0].split(";")
+        data = []
+        for code in codes:
+            data.extend(self.observations[code])
+        return Response([{"page": 1, "pages": 1, "total": len(data)}, data])
+
+
+def get_rows(number, seed=0):
+    """Rows as generated for a combined dataset"""
+    indicator_list = get_indicator_list(max(number // 60, 1), seed)
+    rows = []
+    for observations in get_observations(
+        indicator_list, range(1960, 2020), seed
+    ).values():
+        for observation in observations:
+            value = observation["value"]
+            if value is None:
+                value = 0
+            rows.append(
+                {
+                    "Country Name": "Afghanistan",
+                    "Country ISO3": "AFG",
+                    "Year": int(observation["date"]),
+                    "Indicator Name": observation["indicator"]["value"],
+                    "Indicator Code": observation["indicator"]["id"],
+                    "Value": value,
+                }
+            )
+    return rows[:number]
+
+
+def get_payload(number=10000, seed=0):
+    """Response bytes of the country indicator endpoint with number
+    observations"""
+    indicator_list = get_indicator_list(max(number // 60, 1), seed)
+    data = []
+    for observations in get_observations(
+        indicator_list, range(1960, 2020), seed
+    ).values():
+        data.extend(observations)
+    data = data[:number]
+    header = {
+        "page": 1,
+        "pages": 1,
+        "per_page": 10000,
+        "total": len(data),
+        "sourceid": "2",
+        "lastupdated": "2025-01-28",
+    }
+    return json.dumps([header, data]).encode("utf-8")
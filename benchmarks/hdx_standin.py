@@ -0,0 +1,526 @@
+#!/usr/bin/python
+"""
+HDX stand-in:
+------------
+
+A local stand-in for the parts of the HDX (CKAN) action API used by the
+scraper, keeping packages, resources, resource views and showcases in memory.
+Latency, an error rate and a rate limit can be set so that the upload stage
+can be measured without a live HDX site. Calls and uploaded bytes are counted
+per action and returned by the stats action.
+
+Run with:
+
+    python -m benchmarks.hdx_standin --port 5050 --latency 0.05
+
+and point the scraper at it with HDX_URL=http://localhost:5050 and any
+HDX_KEY.
+
+"""
+
+import argparse
+import json
+import logging
+from collections import Counter, deque
+from copy import deepcopy
+from email.parser import BytesParser
+from email.policy import HTTP
+from fnmatch import fnmatch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+from threading import Lock, Thread
+from time import monotonic, sleep
+from urllib.parse import parse_qsl, urlsplit
+from uuid import uuid4
+
+from hdx.scraper.worldbank.__main__ import _ORGANISATION
+
+logger = logging.getLogger(__name__)
+
+default_tags = (
+    "hxl",
+    "indicators",
+    "economics",
+    "socioeconomics",
+    "gender",
+    "health",
+    "education",
+    "poverty",
+    "population",
+    "environment",
+    "energy",
+    "climate-weather",
+    "agriculture",
+    "infrastructure",
+    "trade",
+    "millennium development goals - mdg",
+)
+
+
+class ActionError(Exception):
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def not_found(message):
+    return ActionError(
+        404, {"__type": "Not Found Error", "message": f"Not found: {message}"}
+    )
+
+
+class HDXStandIn:
+    def __init__(
+        self,
+        latency=0.0,
+        error_rate=0.0,
+        calls_per_second=None,
+        organizations=(),
+        tags=default_tags,
+        seed=0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls_per_second = calls_per_second
+        self.organizations = list(organizations)
+        self.tags = list(tags)
+        self.random = Random(seed)
+        self.lock = Lock()
+        self.call_times = deque()
+        self.calls = Counter()
+        self.errors = Counter()
+        self.rate_limited = Counter()
+        self.upload_bytes = 0
+        self.packages = {}
+        self.resource_packages = {}
+        self.views = {}
+        self.showcases = {}
+        self.associations = set()
+        self.server = None
+        self.url = None
+
+    def start(self, host="localhost", port=0):
+        """Serve in a background thread, returning the URL of the site"""
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                self.respond(parts.path, dict(parse_qsl(parts.query)), {})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("multipart/form-data"):
+                    data, files = parse_multipart(content_type, body)
+                elif body:
+                    data, files = json.loads(body), {}
+                else:
+                    data, files = {}, {}
+                self.respond(self.path, data, files)
+
+            def respond(self, path, data, files):
+                action = path.rstrip("/").rsplit("/", 1)[-1]
+                status, response, headers = standin.handle(action, data, files)
+                body = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        logger.info(f"HDX stand-in running at {self.url}")
+        return self.url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def is_rate_limited(self):
+        """Must be called with lock held"""
+        if not self.calls_per_second:
+            return False
+        now = monotonic()
+        while self.call_times and now - self.call_times[0] >= 1:
+            self.call_times.popleft()
+        if len(self.call_times) >= self.calls_per_second:
+            return True
+        self.call_times.append(now)
+        return False
+
+    def handle(self, action, data, files):
+        """Returns HTTP status, response and extra headers for an action"""
+        if self.latency:
+            sleep(self.latency)
+        with self.lock:
+            self.calls[action] += 1
+            if action != "stats":
+                if self.is_rate_limited():
+                    self.rate_limited[action] += 1
+                    error = {"__type": "Rate Limit", "message": "Too many requests"}
+                    return 429, {"success": False, "error": error}, {"Retry-After": "1"}
+                if self.error_rate and self.random.random() < self.error_rate:
+                    self.errors[action] += 1
+                    error = {"__type": "Internal Server Error", "message": "Injected"}
+                    return 500, {"success": False, "error": error}, {}
+            function = getattr(self, f"action_{action}", None)
+            if function is None:
+                error = {"message": f"Bad request - Action name not known: {action}"}
+                return 400, {"success": False, "error": error}, {}
+            try:
+                result = function(data, files)
+            except ActionError as ex:
+                return ex.status, {"success": False, "error": ex.error}, {}
+        return 200, {"success": True, "result": result}, {}
+
+    def get_stats(self):
+        with self.lock:
+            return self.action_stats({}, {})
+
+    def action_stats(self, data, files):
+        """Must be called with lock held"""
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "rate_limited": dict(self.rate_limited),
+            "upload_bytes": self.upload_bytes,
+            "packages": len(self.packages),
+            "showcases": len(self.showcases),
+        }
+
+    # Users, organizations, vocabularies and locations
+
+    def action_user_show(self, data, files):
+        return {"id": "standin", "name": "standin", "sysadmin": True}
+
+    def action_organization_list_for_user(self, data, files):
+        return [{"id": x, "name": x, "title": x} for x in self.organizations]
+
+    def action_organization_show(self, data, files):
+        return {"id": data["id"], "name": data["id"], "title": data["id"]}
+
+    def action_vocabulary_show(self, data, files):
+        return {
+            "id": "standin-vocabulary",
+            "name": data.get("id"),
+            "tags": [{"name": x} for x in self.tags],
+        }
+
+    def action_group_list(self, data, files):
+        return []
+
+    # Packages
+
+    def get_package(self, id_or_name):
+        package = self.packages.get(id_or_name)
+        if package is None:
+            for package in self.packages.values():
+                if package["id"] == id_or_name:
+                    return package
+            raise not_found(f"package {id_or_name}")
+        return package
+
+    def set_resources(self, package, resources):
+        package["resources"] = []
+        for resource in resources:
+            self.add_resource(package, resource)
+
+    def add_resource(self, package, resource, upload=None):
+        resource = deepcopy(resource)
+        resource.setdefault("id", str(uuid4()))
+        resource["package_id"] = package["id"]
+        if upload:
+            self.upload_bytes += len(upload[1])
+            resource["url"] = (
+                f"{self.url}/dataset/{package['id']}/resource/{resource['id']}"
+                f"/download/{upload[0]}"
+            )
+            resource["url_type"] = "upload"
+        package["resources"].append(resource)
+        self.resource_packages[resource["id"]] = package["name"]
+        return resource
+
+    def action_package_show(self, data, files):
+        return deepcopy(self.get_package(data["id"]))
+
+    def action_package_create(self, data, files):
+        name = data["name"]
+        if name in self.packages:
+            raise ActionError(
+                409,
+                {"__type": "Validation Error", "name": ["That URL is already in use."]},
+            )
+        package = deepcopy(data)
+        package["id"] = str(uuid4())
+        self.set_resources(package, data.get("resources", []))
+        self.packages[name] = package
+        return deepcopy(package)
+
+    def action_package_update(self, data, files):
+        package = self.get_package(data.get("id") or data["name"])
+        updated = deepcopy(data)
+        updated["id"] = package["id"]
+        self.set_resources(updated, data.get("resources", package["resources"]))
+        del self.packages[package["name"]]
+        self.packages[updated["name"]] = updated
+        return deepcopy(updated)
+
+    def action_package_patch(self, data, files):
+        package = self.get_package(data["id"])
+        resources = data.get("resources")
+        package.update({k: deepcopy(v) for k, v in data.items() if k != "resources"})
+        if resources is not None:
+            self.set_resources(package, resources)
+        return deepcopy(package)
+
+    def action_package_revise(self, data, files):
+        match = json.loads(data["match"])
+        package = self.get_package(match.get("id") or match["name"])
+        resources = package.pop("resources")
+        for key in json.loads(data.get("filter", "[]")):
+            key = key.lstrip("-")
+            name, _, index = key.partition("__")
+            if name == "resources" and index:
+                resources[int(index)] = None
+            elif not index:
+                package.pop(name, None)
+        resources = [x for x in resources if x is not None]
+        update = json.loads(data.get("update", "{}"))
+        update_resources = update.pop("resources", [])
+        package.update(update)
+        package["resources"] = []
+        for index, resource in enumerate(update_resources):
+            if index < len(resources):
+                resource = {**resources[index], **resource}
+            upload = files.get(f"update__resources__{index}__upload")
+            self.add_resource(package, resource, upload)
+        for resource in resources[len(update_resources) :]:
+            self.add_resource(package, resource)
+        return {"package": deepcopy(package)}
+
+    def action_package_search(self, data, files):
+        """Supports queries and filter queries made of field:pattern terms
+        joined by AND"""
+        terms = []
+        for query in (data.get("q"), data.get("fq")):
+            if not query or query == "*:*":
+                continue
+            for term in query.replace(" AND ", " ").split():
+                field, _, pattern = term.lstrip("+").partition(":")
+                terms.append((field, pattern.strip('"')))
+        results = []
+        records = list(self.packages.values()) + list(self.showcases.values())
+        for record in records:
+            record_type = "showcase" if record["name"] in self.showcases else "dataset"
+            record = {"dataset_type": record_type, **record}
+            if all(fnmatch(str(record.get(f, "")), p) for f, p in terms):
+                results.append(record)
+        start = int(data.get("start", 0))
+        rows = int(data.get("rows", 10))
+        return {
+            "count": len(results),
+            "results": deepcopy(results[start : start + rows]),
+        }
+
+    def action_package_resource_reorder(self, data, files):
+        package = self.get_package(data["id"])
+        order = data["order"]
+        package["resources"].sort(key=lambda x: order.index(x["id"]))
+        return {"id": package["id"], "order": order}
+
+    def action_package_create_default_resource_views(self, data, files):
+        return []
+
+    def action_hdx_dataset_purge(self, data, files):
+        package = self.get_package(data["id"])
+        del self.packages[package["name"]]
+        return None
+
+    # Resources and resource views
+
+    def get_resource(self, resource_id):
+        name = self.resource_packages.get(resource_id)
+        if name in self.packages:
+            for resource in self.packages[name]["resources"]:
+                if resource["id"] == resource_id:
+                    return self.packages[name], resource
+        raise not_found(f"resource {resource_id}")
+
+    def action_resource_show(self, data, files):
+        return deepcopy(self.get_resource(data["id"])[1])
+
+    def action_resource_create(self, data, files):
+        package = self.get_package(data["package_id"])
+        return deepcopy(self.add_resource(package, data, files.get("upload")))
+
+    def action_resource_update(self, data, files):
+        package, resource = self.get_resource(data["id"])
+        package["resources"].remove(resource)
+        updated = self.add_resource(package, data, files.get("upload"))
+        return deepcopy(updated)
+
+    def action_resource_patch(self, data, files):
+        package, resource = self.get_resource(data["id"])
+        package["resources"].remove(resource)
+        updated = self.add_resource(package, {**resource, **data}, files.get("upload"))
+        return deepcopy(updated)
+
+    def action_resource_delete(self, data, files):
+        package, resource = self.get_resource(data["id"])
+        package["resources"].remove(resource)
+        return None
+
+    def action_resource_view_list(self, data, files):
+        return [x for x in self.views.values() if x["resource_id"] == data["id"]]
+
+    def action_resource_view_show(self, data, files):
+        view = self.views.get(data["id"])
+        if view is None:
+            raise not_found(f"resource view {data['id']}")
+        return view
+
+    def action_resource_view_create(self, data, files):
+        view = deepcopy(data)
+        view["id"] = str(uuid4())
+        self.views[view["id"]] = view
+        return view
+
+    def action_resource_view_update(self, data, files):
+        self.action_resource_view_show(data, files).update(data)
+        return self.views[data["id"]]
+
+    def action_resource_view_delete(self, data, files):
+        self.views.pop(data["id"], None)
+        return None
+
+    def action_resource_view_reorder(self, data, files):
+        return data
+
+    # Showcases
+
+    def get_showcase(self, id_or_name):
+        showcase = self.showcases.get(id_or_name)
+        if showcase is None:
+            for showcase in self.showcases.values():
+                if showcase["id"] == id_or_name:
+                    return showcase
+            raise not_found(f"showcase {id_or_name}")
+        return showcase
+
+    def action_ckanext_showcase_show(self, data, files):
+        return deepcopy(self.get_showcase(data["id"]))
+
+    def action_ckanext_showcase_create(self, data, files):
+        showcase = deepcopy(data)
+        showcase["id"] = str(uuid4())
+        self.showcases[showcase["name"]] = showcase
+        return deepcopy(showcase)
+
+    def action_ckanext_showcase_update(self, data, files):
+        showcase = self.get_showcase(data.get("id") or data["name"])
+        showcase.update(deepcopy(data))
+        return deepcopy(showcase)
+
+    def action_ckanext_showcase_list(self, data, files):
+        return deepcopy(list(self.showcases.values()))
+
+    def action_ckanext_showcase_delete(self, data, files):
+        showcase = self.get_showcase(data["id"])
+        del self.showcases[showcase["name"]]
+        return None
+
+    def action_ckanext_showcase_package_association_create(self, data, files):
+        showcase = self.get_showcase(data["showcase_id"])
+        package = self.get_package(data["package_id"])
+        self.associations.add((showcase["id"], package["id"]))
+        return {"showcase_id": showcase["id"], "package_id": package["id"]}
+
+    def action_ckanext_showcase_package_association_delete(self, data, files):
+        showcase = self.get_showcase(data["showcase_id"])
+        package = self.get_package(data["package_id"])
+        self.associations.discard((showcase["id"], package["id"]))
+        return None
+
+    def action_ckanext_showcase_package_list(self, data, files):
+        showcase = self.get_showcase(data["showcase_id"])
+        return [
+            deepcopy(x)
+            for x in self.packages.values()
+            if (showcase["id"], x["id"]) in self.associations
+        ]
+
+    def action_ckanext_package_showcase_list(self, data, files):
+        package = self.get_package(data["package_id"])
+        return [
+            deepcopy(x)
+            for x in self.showcases.values()
+            if (x["id"], package["id"]) in self.associations
+        ]
+
+
+def parse_multipart(content_type, body):
+    """Parse multipart form data into fields and files (as filename and
+    content)"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body
+    )
+    data = {}
+    files = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        content = part.get_payload(decode=True)
+        filename = part.get_filename()
+        if filename is None:
+            data[name] = content.decode("utf-8")
+        else:
+            files[name] = (filename, content)
+    return data, files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HDX stand-in")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--calls-per-second", type=int, default=None)
+    parser.add_argument("--organization", action="append", default=[_ORGANISATION])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    standin = HDXStandIn(
+        args.latency, args.error_rate, args.calls_per_second, args.organization
+    )
+    standin.start(args.host, args.port)
+    try:
+        while True:
+            sleep(60)
+            logger.info(json.dumps(standin.get_stats()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
+        print(json.dumps(standin.get_stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
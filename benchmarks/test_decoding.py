@@ -0,0 +1,48 @@
+#!/usr/bin/python
+"""
+Benchmarks for decoding World Bank API responses with each JSON backend. Set
+JSON_PAYLOADS_FOLDER to a folder of captured responses to decode those
+instead of the synthetic corpus.
+
+"""
+
+import json
+from glob import glob
+from os import getenv
+from os.path import join
+
+import pytest
+
+from benchmarks.corpus import get_payload
+
+from hdx.scraper.worldbank.decoding import get_loads, orjson
+
+
+def get_payloads():
+    folder = getenv("JSON_PAYLOADS_FOLDER")
+    if not folder:
+        return [get_payload(10000)]
+    payloads = []
+    for path in sorted(glob(join(folder, "*.json"))):
+        with open(path, "rb") as f:
+            payloads.append(f.read())
+    return payloads
+
+
+backends = ["json"]
+if orjson is not None:
+    backends.append("orjson")
+
+
+class TestDecoding:
+    payloads = get_payloads()
+
+    @pytest.mark.parametrize("backend", backends)
+    def test_decode(self, benchmark, backend):
+        loads = get_loads(backend)
+
+        def decode():
+            return [loads(x) for x in self.payloads]
+
+        decoded = benchmark(decode)
+        assert decoded == [json.loads(x) for x in self.payloads]
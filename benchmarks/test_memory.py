@@ -0,0 +1,147 @@
+#!/usr/bin/python
+"""
+Memory tests for processing a large country. Peak traced memory and the
+number of memory blocks still allocated afterwards are measured with
+tracemalloc and compared with the budgets in memory_budgets.json. Set
+UPDATE_MEMORY_BUDGETS=true to write new budgets from the measurements.
+
+"""
+
+import logging
+import resource
+import tracemalloc
+from os import getenv
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import script_dir_plus_file, temp_dir
+from hdx.utilities.saver import save_json
+
+from benchmarks.corpus import Download, get_indicator_list, get_observations, get_rows
+
+from hdx.scraper.worldbank.pipeline import (
+    generate_all_datasets_showcases,
+    generate_combined_dataset_and_showcase,
+)
+
+logger = logging.getLogger(__name__)
+
+country = {"name": "Afghanistan", "iso3": "AFG", "iso2": "AF"}
+# Measurements can go this far over the budget before failing
+tolerance = 0.1
+# Budgets are written with this headroom over the measurements but at least
+# the minimum headroom so that small measurements are not flaky
+headroom = 0.2
+minimum_headroom = {"peak_bytes": 65536, "retained_blocks": 50}
+
+
+def get_budgets_path():
+    return script_dir_plus_file("memory_budgets.json", get_budgets_path)
+
+
+def get_large_country_topics(number_of_topics=15, indicators_per_topic=100):
+    """1,500 indicators over 60 years split into topics"""
+    indicator_list = get_indicator_list(number_of_topics * indicators_per_topic)
+    topics = []
+    for i in range(number_of_topics):
+        start = i * indicators_per_topic
+        topics.append(
+            {
+                "id": str(i),
+                "value": f"Topic {i}",
+                "sourceNote": "Benchmark",
+                "tags": ["health"],
+                "sources": {"2": indicator_list[start : start + indicators_per_topic]},
+            }
+        )
+    observations = get_observations(indicator_list, range(1960, 2020))
+    return topics, Download(observations)
+
+
+def get_blocks():
+    return len(tracemalloc.take_snapshot().traces)
+
+
+def measure(function, *args):
+    """Run function returning peak traced memory in bytes and the number of
+    traced memory blocks still allocated once its result has been dropped.
+    function is run once beforehand so that caches are already filled."""
+    function(*args)
+    # Log records kept by handlers would count as retained blocks
+    logging.disable(logging.CRITICAL)
+    tracemalloc.start()
+    try:
+        start_blocks = get_blocks()
+        start_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        function(*args)
+        _, peak_size = tracemalloc.get_traced_memory()
+        end_blocks = get_blocks()
+    finally:
+        tracemalloc.stop()
+        logging.disable(logging.NOTSET)
+    return {
+        "peak_bytes": peak_size - start_size,
+        "retained_blocks": end_blocks - start_blocks,
+    }
+
+
+def check_budget(name, measurements):
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    logger.info(f"{name}: {measurements} (process max RSS {max_rss} KB)")
+    path = get_budgets_path()
+    budgets = load_json(path, loaderror_if_empty=False) or {}
+    if getenv("UPDATE_MEMORY_BUDGETS", "").lower() in ("1", "true", "yes"):
+        budgets[name] = {
+            key: value + max(int(value * headroom), minimum_headroom[key])
+            for key, value in measurements.items()
+        }
+        save_json(budgets, path, pretty=True)
+        return
+    budget = budgets[name]
+    for key, value in measurements.items():
+        limit = budget[key] * (1 + tolerance)
+        assert value <= limit, (
+            f"{name} {key} of {value} is over budget of {budget[key]}"
+        )
+
+
+class TestMemory:
+    def test_generate_all_datasets_showcases(self, monkeypatch, configuration):
+        # Topics are generated concurrently as with the project configuration
+        monkeypatch.setitem(configuration, "topic_workers", 4)
+        topics, downloader = get_large_country_topics()
+
+        def generate():
+            with temp_dir("MemoryTest", delete_on_success=True) as folder:
+                return generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    folder,
+                    country,
+                    topics,
+                    lambda *args: None,
+                    None,
+                )
+
+        measurements = measure(generate)
+        check_budget("generate_all_datasets_showcases", measurements)
+
+    def test_generate_combined_dataset_and_showcase(self, configuration):
+        rows = get_rows(90000)
+        topics = [{"value": "Health"}]
+
+        def generate():
+            with temp_dir("MemoryTest", delete_on_success=True) as folder:
+                return generate_combined_dataset_and_showcase(
+                    configuration,
+                    folder,
+                    country,
+                    ["health"],
+                    topics,
+                    [],
+                    set(range(1960, 2020)),
+                    rows,
+                )
+
+        measurements = measure(generate)
+        check_budget("generate_combined_dataset_and_showcase", measurements)
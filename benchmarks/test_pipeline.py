@@ -0,0 +1,137 @@
+#!/usr/bin/python
+"""
+Benchmarks for pipeline hot paths.
+
+"""
+
+from hdx.data.dataset import Dataset
+from hdx.utilities.path import temp_dir
+
+from benchmarks.corpus import (
+    Download,
+    get_indicator_list,
+    get_indicator_names,
+    get_observations,
+    get_rows,
+)
+
+from hdx.scraper.worldbank.pipeline import (
+    generate_dataset_and_showcase,
+    get_indicator_batches,
+    get_indicator_short_names,
+    get_qc_indicators,
+    get_unit,
+    headers,
+    hxltags,
+)
+from hdx.scraper.worldbank.writer import generate_resources
+
+quickcharts = {
+    "hashtag": "#indicator+code",
+    "values": [],
+    "numeric_hashtag": "#indicator+value+num",
+    "cutdown": 2,
+    "cutdownhashtags": ["#indicator+code", "#country+code", "#date+year"],
+}
+resourcedata = {"name": "Benchmark", "description": "Benchmark"}
+
+
+class TestPipeline:
+    indicator_names = get_indicator_names()
+
+    def test_get_unit(self, benchmark):
+        def get_units():
+            return [get_unit(x) for x in self.indicator_names]
+
+        units = benchmark(get_units)
+        assert len(units) == 1500
+
+    def test_get_indicator_batches(self, benchmark):
+        indicator_list = get_indicator_list(1500)
+        batches = benchmark(get_indicator_batches, indicator_list, 40, 1000)
+        assert sum(len(x) for x in batches) == 1500
+
+    def test_get_qc_indicators(self, benchmark):
+        indicator_list = get_indicator_list(200)
+        observations = get_observations(indicator_list, range(1960, 2020))
+        indicator_names_dict = {}
+        indicators_len_dict = {}
+        for code, indicator_observations in observations.items():
+            indicator_names_dict[code] = indicator_observations[0]["indicator"]["value"]
+            indicators_dict = indicators_len_dict.setdefault(len(code), {})
+            indicators_dict[code] = {
+                int(x["date"]): x["value"] for x in indicator_observations
+            }
+        qc_indicators = benchmark(
+            get_qc_indicators, indicators_len_dict, indicator_names_dict
+        )
+        assert None not in qc_indicators
+
+    def test_get_indicator_short_names(self, benchmark):
+        short_names = benchmark(get_indicator_short_names, self.indicator_names)
+        assert len(short_names) < len(self.indicator_names)
+
+    def test_generate_dataset_and_showcase(self, benchmark, configuration):
+        # 170 indicators over 60 years is about 10,000 observations which all
+        # go through add_rows
+        indicator_list = get_indicator_list(170)
+        downloader = Download(get_observations(indicator_list, range(1960, 2020)))
+        country = {"name": "Afghanistan", "iso3": "AFG", "iso2": "AF"}
+        topic = {
+            "id": "8",
+            "value": "Health",
+            "sourceNote": "Benchmark",
+            "tags": ["health"],
+            "sources": {"2": indicator_list},
+        }
+        with temp_dir("BenchmarkPipeline", delete_on_success=True) as folder:
+            result = benchmark(
+                generate_dataset_and_showcase,
+                configuration,
+                downloader,
+                folder,
+                country,
+                topic,
+            )
+        assert len(result[4]) > 9000
+
+    def test_generate_resources(self, benchmark, configuration):
+        rows = get_rows(50000)
+
+        def generate():
+            dataset = Dataset({"name": "benchmark"})
+            return generate_resources(
+                dataset,
+                headers,
+                rows,
+                hxltags,
+                folder,
+                "benchmark.csv",
+                resourcedata,
+                quickcharts,
+            )
+
+        with temp_dir("BenchmarkPipeline", delete_on_success=True) as folder:
+            success, _ = benchmark(generate)
+        assert success is True
+
+    def test_generate_resource_from_iterable(self, benchmark, configuration):
+        """The library method that generate_resources replaced for
+        comparison"""
+        rows = get_rows(50000)
+
+        def generate():
+            dataset = Dataset({"name": "benchmark"})
+            return dataset.generate_resource_from_iterable(
+                headers,
+                rows,
+                hxltags,
+                folder,
+                "benchmark.csv",
+                resourcedata,
+                quickcharts=quickcharts,
+            )
+
+        with temp_dir("BenchmarkPipeline", delete_on_success=True) as folder:
+            success, _ = benchmark(generate)
+        assert success is True
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+"""
+Benchmarks for uploads to HDX using the local HDX stand-in.
+
+"""
+
+from contextlib import contextmanager
+from os.path import join
+
+from hdx.api.configuration import Configuration
+from hdx.utilities.path import temp_dir
+
+from benchmarks.corpus import Download, get_indicator_list, get_observations
+from benchmarks.hdx_standin import HDXStandIn
+
+from hdx.scraper.worldbank.__main__ import _ORGANISATION, create_dataset_showcase
+from hdx.scraper.worldbank.hdx_state import HDXState
+from hdx.scraper.worldbank.pipeline import generate_dataset_and_showcase
+from hdx.scraper.worldbank.uploader import Uploader
+
+batch = "6b3d3b1a-3c4e-4b8f-9a5d-2e1f0c9b8a7d"
+number_of_topics = 20
+
+
+@contextmanager
+def use_standin(configuration, **kwargs):
+    """Run stand-in and set it as the global HDX configuration"""
+    with HDXStandIn(organizations=[_ORGANISATION], **kwargs) as standin:
+        Configuration._create(
+            user_agent="test",
+            hdx_url=standin.url,
+            hdx_key="standin",
+            hdx_read_only=False,
+            project_config_yaml=join("tests", "config", "project_configuration.yaml"),
+        )
+        try:
+            yield standin
+        finally:
+            Configuration.setup(configuration)
+
+
+def generate_topics(configuration, folder):
+    indicator_list = get_indicator_list(40)
+    downloader = Download(get_observations(indicator_list, range(1960, 2020)))
+    country = {"name": "Afghanistan", "iso3": "AFG", "iso2": "AF"}
+    topics = []
+    for i in range(number_of_topics):
+        topic = {
+            "id": str(i),
+            "value": f"Topic {i}",
+            "sourceNote": "Benchmark",
+            "tags": ["health"],
+            "sources": {"2": indicator_list},
+        }
+        dataset, showcase, qc_indicators, _, _ = generate_dataset_and_showcase(
+            configuration, downloader, folder, country, topic
+        )
+        topics.append((dataset, showcase, qc_indicators))
+    return topics
+
+
+def upload(topics, hdx_state, retries=1):
+    with Uploader(max_workers=4, retries=retries, retry_wait=0) as uploader:
+        for dataset, showcase, qc_indicators in topics:
+            create_dataset_showcase(
+                uploader, hdx_state, None, dataset, showcase, qc_indicators, batch
+            )
+        uploader.wait()
+
+
+class TestUpload:
+    def test_upload(self, benchmark, configuration):
+        with (
+            use_standin(configuration, latency=0.02) as standin,
+            temp_dir("BenchmarkUpload", delete_on_success=True) as folder,
+        ):
+            rounds = []
+
+            def setup():
+                rounds.append(None)
+                topics = generate_topics(configuration, folder)
+                hdx_state = HDXState.prefetch(_ORGANISATION, "name:world-bank-*")
+                return (topics, hdx_state), {}
+
+            benchmark.pedantic(upload, setup=setup, rounds=3)
+            stats = standin.get_stats()
+        benchmark.extra_info.update(stats)
+        assert stats["packages"] == number_of_topics
+        assert stats["showcases"] == number_of_topics
+        calls = stats["calls"]
+        assert calls["package_create"] == number_of_topics
+        # Later rounds update using the prefetched state
+        assert calls["package_revise"] == len(rounds) * number_of_topics
+        assert "package_show" not in calls
+
+    def test_upload_errors(self, benchmark, configuration):
+        with (
+            use_standin(
+                configuration, latency=0.01, error_rate=0.05, calls_per_second=100
+            ) as standin,
+            temp_dir("BenchmarkUpload", delete_on_success=True) as folder,
+        ):
+            topics = generate_topics(configuration, folder)
+            hdx_state = HDXState.prefetch(_ORGANISATION, "name:world-bank-*")
+            benchmark.pedantic(upload, (topics, hdx_state, 10), rounds=1)
+            stats = standin.get_stats()
+        benchmark.extra_info.update(stats)
+        assert stats["packages"] == number_of_topics
+        assert sum(stats["errors"].values()) > 0
@@ -5,14 +5,23 @@ Top level script. Calls other functions that generate datasets that this script
 """
 
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from copy import deepcopy
+from functools import cache, partial
+from os import getenv, makedirs
 from os.path import expanduser, join
+from time import perf_counter
 
 from hdx.api.configuration import Configuration
 from hdx.data.hdxobject import HDXError
 from hdx.data.user import User
 from hdx.facades.simple import facade
-from hdx.utilities.downloader import Download, DownloadError
+from hdx.utilities.dictandlist import merge_two_dictionaries
+from hdx.utilities.downloader import DownloadError
+from hdx.utilities.loader import load_json, load_yaml
 from hdx.utilities.path import (
+    get_temp_dir,
     progress_storing_folder,
     script_dir_plus_file,
     wheretostart_tempdir_batch,
@@ -26,32 +35,452 @@ from tenacity import (
 )
 
 from hdx.scraper.worldbank._version import __version__
+from hdx.scraper.worldbank.availability import AvailabilityIndex, DenyList
+from hdx.scraper.worldbank.buffers import ResourceBuffers
+from hdx.scraper.worldbank.hdx_state import HDXState
+from hdx.scraper.worldbank.parquet import ParquetExport
 from hdx.scraper.worldbank.pipeline import (
     generate_all_datasets_showcases,
     generate_topline_dataset,
     get_countries,
     get_topics,
+    get_valid_countries,
 )
+from hdx.scraper.worldbank.planner import RunPlanner, get_deadline
+from hdx.scraper.worldbank.profiling import Profiler
+from hdx.scraper.worldbank.refresh import SourceUpdates
+from hdx.scraper.worldbank.scheduler import CountryScheduler
+from hdx.scraper.worldbank.session import PooledDownload
+from hdx.scraper.worldbank.sharding import get_shard
+from hdx.scraper.worldbank.staging import Stager, load_manifest, load_staged
+from hdx.scraper.worldbank.uploader import Uploader
+from hdx.scraper.worldbank.warehouse import Warehouse
 
 logger = logging.getLogger(__name__)
 
 _LOOKUP = "hdx-scraper-worldbank"
 _UPDATED_BY_SCRIPT = "HDX Scraper: WorldBank"
+_ORGANISATION = "905a9a49-5325-4a31-a9d7-147a60a8387c"
 
+retry_on_error = retry(
+    retry=(retry_if_exception_type(DownloadError) | retry_if_exception_type(HDXError)),
+    stop=stop_after_attempt(5),
+    wait=wait_fixed(3600),
+    after=after_log(logger, logging.INFO),
+)
+
+
+def get_option(configuration, key, default=None):
+    """Get option from environment variable (key in upper case) falling back
+    on project configuration"""
+    value = getenv(key.upper())
+    if value is None:
+        return configuration.get(key, default)
+    if isinstance(default, bool):
+        return value.lower() in ("1", "true", "yes")
+    if isinstance(default, int):
+        return int(value)
+    return value
+
+
+def get_state_folder(configuration, shared=False):
+    """Folder for state that persists between runs. Unless shared, each shard
+    has its own folder within it so that shards on one host or on shared
+    storage do not overwrite each other's state files."""
+    state_folder = get_option(configuration, "state_folder")
+    if not state_folder:
+        state_folder = join(get_temp_dir(), f"{_LOOKUP}-state")
+    shard_count = get_option(configuration, "shard_count", 1)
+    if not shared and shard_count > 1:
+        shard_index = get_option(configuration, "shard_index", 0)
+        state_folder = join(state_folder, f"shard-{shard_index}-of-{shard_count}")
+    makedirs(state_folder, exist_ok=True)
+    return state_folder
+
+
+def get_http_cache_folder(configuration):
+    """Folder for the validators of World Bank API responses or None if
+    conditional requests are turned off"""
+    if not get_option(configuration, "conditional_requests", False):
+        return None
+    return join(get_state_folder(configuration), "http_cache")
+
+
+def get_request_threads(configuration, generate_workers=1):
+    """Number of threads that can request the World Bank API at once: the
+    topic workers of each country generated concurrently"""
+    return generate_workers * configuration.get("topic_workers", 1)
+
+
+def get_scheduler(configuration):
+    return CountryScheduler(join(get_state_folder(configuration), "country_costs.json"))
+
+
+def get_availability(configuration):
+    if not get_option(configuration, "availability_index", True):
+        return None
+    return AvailabilityIndex(
+        join(get_state_folder(configuration), "availability.json"),
+        get_option(configuration, "availability_max_age_days", 180),
+        get_option(configuration, "availability_min_age_days", 14),
+    )
+
+
+def get_denylist(configuration):
+    return DenyList(
+        join(get_state_folder(configuration), "denylist.json"),
+        get_option(configuration, "denylist_max_age_days", 90),
+        get_option(configuration, "denylist_min_age_days", 7),
+    )
+
+
+def get_warehouse(configuration):
+    """Observation warehouse or None if it is turned off"""
+    if not get_option(configuration, "warehouse", False):
+        return None
+    path = get_option(configuration, "warehouse_path")
+    if not path:
+        # Shared by the shards as the topline can need every country
+        path = join(get_state_folder(configuration, True), "warehouse.sqlite")
+    return Warehouse(path, get_option(configuration, "warehouse_offline", False))
+
+
+def get_catalog(configuration, downloader, warehouse, source_updates=None):
+    """Topics and valid countries from the World Bank API which are saved in
+    the warehouse or, when the warehouse is offline, read from it. The last
+    updated dates of sources are added to source_updates if given."""
+    if warehouse and warehouse.offline:
+        return warehouse.get_catalog("topics"), warehouse.get_catalog("countries")
+    base_url = configuration["base_url"]
+    if source_updates:
+        topics = get_topics(base_url, downloader, source_updates.lastupdated)
+    else:
+        topics = get_topics(base_url, downloader)
+    countries = get_valid_countries(get_countries(base_url, downloader))
+    if warehouse:
+        warehouse.save_catalog("topics", topics)
+        warehouse.save_catalog("countries", countries)
+    return topics, countries
+
+
+def get_source_updates(configuration):
+    """Last updated dates of sources for a selective refresh or None if it is
+    turned off"""
+    if not get_option(configuration, "selective_refresh", False):
+        return None
+    return SourceUpdates(join(get_state_folder(configuration), "source_updates.json"))
+
+
+def get_updated_sources(source_updates, warehouse):
+    """Sources updated since the previous run or None to refresh all of
+    them"""
+    if not source_updates:
+        return None
+    if warehouse and not source_updates.previous_warehouse:
+        logger.info("Refreshing all sources as the warehouse was not filled before")
+        return None
+    if not warehouse:
+        logger.info(
+            "No warehouse so topics of sources that were not updated are fetched "
+            "again for combined datasets"
+        )
+    return source_updates.get_updated_sources()
 
-def create_dataset_showcase(dataset, showcase, qc_indicators, batch):
-    dataset.update_from_yaml(
-        script_dir_plus_file(join("config", "hdx_dataset_static.yaml"), main)
+
+def get_planner(configuration, countries, scheduler):
+    """Planner for a run that must finish by a deadline or None if there is
+    no deadline"""
+    deadline = get_deadline(get_option(configuration, "run_deadline", ""))
+    if deadline is None:
+        return None
+    return RunPlanner(
+        deadline,
+        scheduler.get_costs(countries),
+        join(get_state_folder(configuration), "deferred.json"),
+    )
+
+
+def get_shard_countries(configuration, countries):
+    """Countries of this shard. Balanced sharding needs a costs file shared by
+    all shards since costs that differ between machines give partitions that
+    overlap or miss countries."""
+    shard_count = get_option(configuration, "shard_count", 1)
+    shard_method = get_option(configuration, "shard_method", "hash")
+    shard_costs_file = get_option(configuration, "shard_costs_file")
+    if shard_costs_file:
+        costs = load_json(shard_costs_file)
+    elif shard_method == "balanced" and shard_count > 1:
+        raise ValueError("Balanced sharding requires SHARD_COSTS_FILE!")
+    else:
+        costs = None
+    return get_shard(
+        countries,
+        shard_count,
+        get_option(configuration, "shard_index", 0),
+        shard_method,
+        costs,
     )
+
+
+def get_parquet_folder(configuration, output_folder):
+    """Folder for the Parquet export which must outlive the run's temporary
+    folder"""
+    return get_option(configuration, "parquet_folder") or output_folder
+
+
+def is_topline_shard(configuration):
+    return get_option(configuration, "shard_index", 0) == get_option(
+        configuration, "topline_shard", 0
+    )
+
+
+def get_run_folder(configuration):
+    """Folder name for progress and staged output which is separate per shard"""
+    shard_count = get_option(configuration, "shard_count", 1)
+    if shard_count < 2:
+        return _LOOKUP
+    shard_index = get_option(configuration, "shard_index", 0)
+    return f"{_LOOKUP}-shard-{shard_index}-of-{shard_count}"
+
+
+@cache
+def get_static_metadata(filename):
+    return load_yaml(script_dir_plus_file(join("config", filename), main))
+
+
+def update_from_static(dataset, filename):
+    """Update dataset with static metadata from YAML file in config folder
+    which is only read once"""
+    merge_two_dictionaries(dataset.data, deepcopy(get_static_metadata(filename)))
+
+
+def get_topline(configuration):
+    """Dictionary in which the latest topline indicator rows of each country
+    are collected or None if the topline is always requested separately"""
+    if get_option(configuration, "topline_from_countries", True):
+        return {}
+    return None
+
+
+def generate_topline(
+    configuration, downloader, folder, countries, topline, warehouse=None
+):
+    """Generate topline dataset from the rows of the countries if all of them
+    were processed in this run, otherwise from the warehouse if it is offline
+    or else from the World Bank API"""
+    if topline is not None and any(x["iso3"] not in topline for x in countries):
+        topline = None
+    if topline is None and warehouse and warehouse.offline:
+        topline = warehouse.get_latest_rows(
+            {x["iso3"] for x in countries}, configuration["topline_indicators"]
+        )
+    dataset = generate_topline_dataset(
+        configuration["base_url"],
+        downloader,
+        folder,
+        countries,
+        configuration["topline_indicators"],
+        topline,
+    )
+    update_from_static(dataset, "hdx_topline_dataset_static.yaml")
+    return dataset
+
+
+def upload_dataset_showcase(
+    uploader, hdx_state, dataset, showcase, batch, updated_by_script, buffers=None
+):
+    if buffers:
+        buffers.place(dataset)
+
+    def submit(*steps):
+        future = uploader.submit(dataset["name"], *steps)
+        if buffers:
+            # Resource files in memory are no longer needed once uploaded
+            future.add_done_callback(lambda _: buffers.release(dataset))
+        return future
+
+    def create_dataset():
+        if hdx_state:
+            hdx_state.attach_dataset(dataset)
+        dataset.create_in_hdx(
+            remove_additional_resources=True,
+            hxl_update=False,
+            updated_by_script=updated_by_script,
+            batch=batch,
+        )
+        if hdx_state:
+            hdx_state.add_dataset(dataset)
+
+    if showcase is None:
+        return submit(create_dataset)
+
+    datasets_to_check = None
+
+    def create_showcase():
+        nonlocal datasets_to_check
+        if hdx_state:
+            datasets_to_check = hdx_state.create_showcase(showcase)
+        else:
+            showcase.create_in_hdx()
+
+    def add_dataset():
+        showcase.add_dataset(dataset, datasets_to_check=datasets_to_check)
+
+    return submit(create_dataset, create_showcase, add_dataset)
+
+
+def create_dataset_showcase(
+    uploader, hdx_state, buffers, dataset, showcase, qc_indicators, batch
+):
+    update_from_static(dataset, "hdx_dataset_static.yaml")
     dataset.generate_quickcharts(-1, indicators=qc_indicators)
-    dataset.create_in_hdx(
-        remove_additional_resources=True,
-        hxl_update=False,
-        updated_by_script="HDX Scraper: World Bank",
-        batch=batch,
+    upload_dataset_showcase(
+        uploader,
+        hdx_state,
+        dataset,
+        showcase,
+        batch,
+        "HDX Scraper: World Bank",
+        buffers,
     )
-    showcase.create_in_hdx()
-    showcase.add_dataset(dataset)
+
+
+def defer_dataset_showcase(buffers, dataset, showcase, qc_indicators, batch):
+    """Topic dataset left for a later run so its resource files are not
+    needed"""
+    logger.info(f"Deferring {dataset['name']}")
+    buffers.release(dataset)
+
+
+def stage_dataset_showcase(stager, key, dataset, showcase, qc_indicators, batch):
+    update_from_static(dataset, "hdx_dataset_static.yaml")
+    stager.stage(
+        key, dataset, showcase, "HDX Scraper: World Bank", indicators=qc_indicators
+    )
+
+
+def generate_and_stage(configuration, output_folder):
+    """Generate all datasets and showcases without touching HDX, staging them
+    in output_folder for a later publish step"""
+    stager = Stager(output_folder)
+    scheduler = get_scheduler(configuration)
+    availability = get_availability(configuration)
+    denylist = get_denylist(configuration)
+    combined_qc_indicators = configuration["combined_qc_indicators"]
+    warehouse = get_warehouse(configuration)
+    source_updates = get_source_updates(configuration)
+    workers = get_option(configuration, "generate_workers", 4)
+    with PooledDownload.from_configuration(
+        configuration,
+        get_http_cache_folder(configuration),
+        get_request_threads(configuration, workers),
+    ) as downloader:
+        topics, all_countries = get_catalog(
+            configuration, downloader, warehouse, source_updates
+        )
+        updated_sources = get_updated_sources(source_updates, warehouse)
+        logger.info(f"Number of countries: {len(all_countries)}")
+        countries = get_shard_countries(configuration, all_countries)
+
+        topline = get_topline(configuration)
+        parquet = ParquetExport.from_configuration(
+            configuration, get_parquet_folder(configuration, output_folder)
+        )
+
+        @retry_on_error
+        def generate_country(country):
+            countryiso = country["iso3"]
+            folder = get_temp_dir(countryiso, tempdir=output_folder)
+            with scheduler.timed(countryiso):
+                dataset, showcase, bites_disabled = generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    folder,
+                    country,
+                    topics,
+                    partial(stage_dataset_showcase, stager, countryiso),
+                    None,
+                    availability,
+                    denylist,
+                    topline,
+                    parquet,
+                    warehouse=warehouse,
+                    updated_sources=updated_sources,
+                )
+            if dataset is None:
+                return
+            update_from_static(dataset, "hdx_dataset_static.yaml")
+            stager.stage(
+                countryiso,
+                dataset,
+                showcase,
+                _UPDATED_BY_SCRIPT,
+                bites_disabled=bites_disabled,
+                indicators=combined_qc_indicators,
+            )
+
+        # Dispatching the longest countries first shortens the overall time
+        scheduled_countries = scheduler.order(countries)
+        predicted = scheduler.predict(scheduled_countries, workers)
+        start = perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in executor.map(generate_country, scheduled_countries):
+                    pass
+            scheduler.report(predicted, perf_counter() - start)
+        finally:
+            # What was learned about the countries that were generated is kept
+            # even if a country failed
+            scheduler.save()
+            if availability:
+                availability.save()
+            denylist.save()
+        # Only saved once every country has been generated since the next
+        # selective refresh would otherwise skip the countries that failed
+        if source_updates:
+            source_updates.save(warehouse is not None)
+
+        if is_topline_shard(configuration):
+            dataset = generate_topline(
+                configuration,
+                downloader,
+                output_folder,
+                all_countries,
+                topline,
+                warehouse,
+            )
+            stager.stage("topline", dataset, None, _UPDATED_BY_SCRIPT)
+    if warehouse:
+        warehouse.close()
+    stager.save_manifest(["topline"] + [x["iso3"] for x in countries])
+
+
+def publish_staged(configuration, output_folder, uploader, hdx_state):
+    """Publish datasets and showcases staged by generate_and_stage to HDX"""
+    with wheretostart_tempdir_batch(
+        folder=get_run_folder(configuration), batch=get_option(configuration, "batch")
+    ) as info:
+        batch = info["batch"]
+
+        @retry_on_error
+        def publish_group(group):
+            try:
+                for entry in group["entries"]:
+                    dataset, showcase, quickcharts, updated_by_script = load_staged(
+                        output_folder, entry["filename"]
+                    )
+                    if quickcharts:
+                        dataset.generate_quickcharts(-1, **quickcharts)
+                    upload_dataset_showcase(
+                        uploader, hdx_state, dataset, showcase, batch, updated_by_script
+                    )
+            finally:
+                uploader.wait()
+
+        groups = load_manifest(output_folder)
+        for _, group in progress_storing_folder(info, groups, "key"):
+            publish_group(group)
+        uploader.log_summary()
 
 
 def main():
@@ -59,80 +488,175 @@ def main():
 
     logger.info(f"##### {_LOOKUP} version {__version__} ####")
     configuration = Configuration.read()
-    User.check_current_user_write_access("905a9a49-5325-4a31-a9d7-147a60a8387c")
+    output_folder = get_option(configuration, "output_folder")
+    if not output_folder:
+        output_folder = get_temp_dir(f"{get_run_folder(configuration)}-staged")
+    if get_option(configuration, "generate_only", False):
+        generate_and_stage(configuration, output_folder)
+        return
+    User.check_current_user_write_access(_ORGANISATION)
+    if get_option(configuration, "prefetch_hdx_state", True):
+        hdx_state = HDXState.prefetch(
+            _ORGANISATION, configuration["showcase_prefetch_query"]
+        )
+    else:
+        hdx_state = None
+    if get_option(configuration, "publish_only", False):
+        with Uploader.from_configuration(configuration) as uploader:
+            publish_staged(configuration, output_folder, uploader, hdx_state)
+        return
 
-    with Download(status_forcelist=[400, 429, 500, 502, 503, 504]) as downloader:
-        with wheretostart_tempdir_batch(folder=_LOOKUP) as info:
+    with (
+        PooledDownload.from_configuration(
+            configuration,
+            get_http_cache_folder(configuration),
+            get_request_threads(configuration),
+        ) as downloader,
+        Uploader.from_configuration(configuration) as uploader,
+    ):
+        run_folder = get_run_folder(configuration)
+        with wheretostart_tempdir_batch(
+            folder=run_folder,
+            batch=get_option(configuration, "batch"),
+        ) as info:
             folder = info["folder"]
             batch = info["batch"]
             configuration = Configuration.read()
-            base_url = configuration["base_url"]
             combined_qc_indicators = configuration["combined_qc_indicators"]
-            topics = get_topics(base_url, downloader)
-            countries = get_countries(base_url, downloader)
-            logger.info(f"Number of countries: {len(countries)}")
+            warehouse = get_warehouse(configuration)
+            source_updates = get_source_updates(configuration)
+            topics, all_countries = get_catalog(
+                configuration, downloader, warehouse, source_updates
+            )
+            updated_sources = get_updated_sources(source_updates, warehouse)
+            logger.info(f"Number of countries: {len(all_countries)}")
+            scheduler = get_scheduler(configuration)
+            availability = get_availability(configuration)
+            denylist = get_denylist(configuration)
+            countries = get_shard_countries(configuration, all_countries)
 
-            dataset = generate_topline_dataset(
-                base_url,
-                downloader,
-                folder,
-                countries,
-                configuration["topline_indicators"],
+            topline = get_topline(configuration)
+            buffers = ResourceBuffers.from_configuration(
+                configuration, folder, f"{run_folder}-buffers"
             )
-            logger.info("Adding topline indicators")
-            dataset.update_from_yaml(
-                script_dir_plus_file(
-                    join("config", "hdx_topline_dataset_static.yaml"), main
-                )
+            parquet = ParquetExport.from_configuration(
+                configuration, get_parquet_folder(configuration, output_folder)
             )
-            dataset.create_in_hdx(
-                remove_additional_resources=True,
-                hxl_update=False,
-                updated_by_script="HDX Scraper: WorldBank",
-                batch=batch,
+            profiler = Profiler.from_configuration(
+                configuration, f"{run_folder}-profiles"
             )
+            planner = get_planner(configuration, countries, scheduler)
+            if planner:
+                countries = planner.order(countries, folder)
+            countryisos = [x["iso3"] for x in countries]
 
-            @retry(
-                retry=(
-                    retry_if_exception_type(DownloadError)
-                    | retry_if_exception_type(HDXError)
-                ),
-                stop=stop_after_attempt(5),
-                wait=wait_fixed(3600),
-                after=after_log(logger, logging.INFO),
-            )
+            @retry_on_error
             def process_country(nextdict):
-                dataset, showcase, bites_disabled = generate_all_datasets_showcases(
+                countryiso = nextdict["iso3"]
+                start = perf_counter()
+                if planner:
+                    remaining = countryisos[countryisos.index(countryiso) :]
+                    deferred = planner.plan(countryiso, remaining)
+                else:
+                    deferred = False
+                if planner and countryiso in planner.deferred:
+                    # Topic datasets deferred in the previous run are all due
+                    country_updated_sources = None
+                else:
+                    country_updated_sources = updated_sources
+                if deferred:
+                    create = partial(defer_dataset_showcase, buffers)
+                else:
+                    create = partial(
+                        create_dataset_showcase, uploader, hdx_state, buffers
+                    )
+                if profiler:
+                    profile = profiler.profile(countryiso)
+                else:
+                    profile = nullcontext()
+                try:
+                    with scheduler.timed(countryiso), profile:
+                        (
+                            dataset,
+                            showcase,
+                            bites_disabled,
+                        ) = generate_all_datasets_showcases(
+                            configuration,
+                            downloader,
+                            buffers.get_folder(countryiso),
+                            nextdict,
+                            topics,
+                            create,
+                            batch,
+                            availability,
+                            denylist,
+                            topline,
+                            parquet,
+                            profiler,
+                            warehouse,
+                            country_updated_sources,
+                            buffers.get_disk_folder(countryiso),
+                        )
+                    if dataset is not None:
+                        update_from_static(dataset, "hdx_dataset_static.yaml")
+                        dataset.generate_quickcharts(
+                            -1,
+                            bites_disabled=bites_disabled,
+                            indicators=combined_qc_indicators,
+                        )
+                        upload_dataset_showcase(
+                            uploader,
+                            hdx_state,
+                            dataset,
+                            showcase,
+                            batch,
+                            _UPDATED_BY_SCRIPT,
+                            buffers,
+                        )
+                finally:
+                    # Progress is stored per country so wait for its uploads
+                    uploader.wait()
+                if planner:
+                    planner.record(countryiso, perf_counter() - start, deferred)
+                if deferred:
+                    # Time without topic datasets is not the country's cost
+                    scheduler.timings.pop(countryiso, None)
+
+            # Not ordered by cost here as stored progress relies on the order
+            predicted = scheduler.predict(countries)
+            start = perf_counter()
+            with buffers:
+                for _, nextdict in progress_storing_folder(info, countries, "iso3"):
+                    process_country(nextdict)
+            scheduler.report(predicted, perf_counter() - start)
+            scheduler.save()
+            if availability:
+                availability.save()
+            denylist.save()
+            if planner:
+                planner.save()
+            if source_updates:
+                source_updates.save(warehouse is not None)
+            if profiler:
+                profiler.log_summary()
+
+            if is_topline_shard(configuration):
+                dataset = generate_topline(
                     configuration,
                     downloader,
                     folder,
-                    nextdict,
-                    topics,
-                    create_dataset_showcase,
-                    batch,
+                    all_countries,
+                    topline,
+                    warehouse,
                 )
-                if dataset is not None:
-                    dataset.update_from_yaml(
-                        script_dir_plus_file(
-                            join("config", "hdx_dataset_static.yaml"), main
-                        )
-                    )
-                    dataset.generate_quickcharts(
-                        -1,
-                        bites_disabled=bites_disabled,
-                        indicators=combined_qc_indicators,
-                    )
-                    dataset.create_in_hdx(
-                        remove_additional_resources=True,
-                        hxl_update=False,
-                        updated_by_script=_UPDATED_BY_SCRIPT,
-                        batch=batch,
-                    )
-                    showcase.create_in_hdx()
-                    showcase.add_dataset(dataset)
-
-            for _, nextdict in progress_storing_folder(info, countries, "iso3"):
-                process_country(nextdict)
+                logger.info("Adding topline indicators")
+                upload_dataset_showcase(
+                    uploader, hdx_state, dataset, None, batch, _UPDATED_BY_SCRIPT
+                )
+                uploader.wait()
+            if warehouse:
+                warehouse.close()
+            uploader.log_summary()
 
 
 if __name__ == "__main__":
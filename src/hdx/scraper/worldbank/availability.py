@@ -0,0 +1,112 @@
+#!/usr/bin/python
+"""
+Availability:
+------------
+
+Indexes of indicators to leave out of the batches requested for a country
+built from the results of previous runs. The availability index holds the
+indicators known to have no data for a country so that requests that would
+return nothing are not made. The deny list holds indicators whose requests
+fail so that they do not cause the loss of the other indicators in their
+batch. Each entry expires after a number of days so that indicators that gain
+data or are fixed are picked up again. Entries that are still there when they
+are checked again expire after longer, so indicators that have been empty for
+years are requested less often than those that have only just become empty.
+
+"""
+
+import logging
+from datetime import date
+from os.path import exists
+from threading import Lock
+from zlib import crc32
+
+from hdx.utilities.dateparse import now_utc
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+class IndicatorIndex:
+    description = "indicators"
+
+    def __init__(self, path=None, max_age_days=30, min_age_days=7, today=None):
+        self.path = path
+        if path and exists(path):
+            self.entries = load_json(path, loaderror_if_empty=False) or {}
+        else:
+            self.entries = {}
+        self.max_age_days = max_age_days
+        self.min_age_days = min_age_days
+        if today is None:
+            today = now_utc()
+        self.today = today.date()
+        self.lock = Lock()
+        self.skipped = 0
+
+    def get_expiry_days(self, countryiso, indicator_code, first, checked):
+        """Number of days after being checked that an entry expires. This is
+        the time since the entry was first added bounded by the minimum and
+        maximum ages, less up to a quarter which varies by country and
+        indicator so that entries added in the same run do not all expire in
+        the same run."""
+        days = (checked - first).days
+        days = min(max(days, self.min_age_days), self.max_age_days)
+        jitter = crc32(f"{countryiso} {indicator_code}".encode("utf-8")) % 100
+        return days * (1 - jitter / 400)
+
+    def is_in_index(self, countryiso, indicator_code):
+        entry = self.entries.get(countryiso, {}).get(indicator_code)
+        if entry is None:
+            return False
+        first, checked = (date.fromisoformat(x) for x in entry)
+        expiry_days = self.get_expiry_days(countryiso, indicator_code, first, checked)
+        return (self.today - checked).days < expiry_days
+
+    def add_entry(self, country_entries, indicator_code):
+        """Add entry keeping the date it was first added. Must be called with
+        lock held."""
+        today = self.today.isoformat()
+        entry = country_entries.get(indicator_code)
+        if entry is None:
+            country_entries[indicator_code] = [today, today]
+        else:
+            country_entries[indicator_code] = [entry[0], today]
+
+    def filter(self, countryiso, indicator_list):
+        """Remove indicators in index for country"""
+        filtered = [
+            x for x in indicator_list if not self.is_in_index(countryiso, x["id"])
+        ]
+        with self.lock:
+            self.skipped += len(indicator_list) - len(filtered)
+        return filtered
+
+    def save(self):
+        logger.info(f"Skipped {self.skipped} {self.description}")
+        if self.path:
+            save_json(self.entries, self.path)
+
+
+class AvailabilityIndex(IndicatorIndex):
+    description = "indicators known to have no data"
+
+    def record(self, countryiso, indicator_codes, found_codes):
+        """Record which of the requested indicator codes had data for country"""
+        with self.lock:
+            country_entries = self.entries.setdefault(countryiso, {})
+            for indicator_code in indicator_codes:
+                if indicator_code in found_codes:
+                    country_entries.pop(indicator_code, None)
+                else:
+                    self.add_entry(country_entries, indicator_code)
+
+
+class DenyList(IndicatorIndex):
+    description = "indicators on deny list"
+
+    def add(self, countryiso, indicator_code):
+        """Add indicator whose request failed for country"""
+        with self.lock:
+            self.add_entry(self.entries.setdefault(countryiso, {}), indicator_code)
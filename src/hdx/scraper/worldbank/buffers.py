@@ -0,0 +1,148 @@
+#!/usr/bin/python
+"""
+Buffers:
+-------
+
+Keeps generated resource files in memory until they have been uploaded to
+HDX. The HDX library uploads files by path, so the files are written to a
+memory backed folder (tmpfs such as /dev/shm) rather than held in Python
+buffers. Files larger than a threshold, or that would take the memory in use
+over a total, are spilled to the folder on disk. Whether a country's files
+are written to memory at all is decided beforehand from the memory in use, and
+if the memory backed filesystem still fills up, the file being written goes
+to disk instead. Files in memory are deleted once their dataset has been uploaded.
+
+"""
+
+import logging
+from os import makedirs, remove
+from os.path import dirname, exists, getsize, isdir, join, relpath
+from shutil import disk_usage, move, rmtree
+from threading import Lock
+
+from hdx.utilities.path import get_temp_dir
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceBuffers:
+    def __init__(
+        self,
+        disk_folder,
+        memory_folder=None,
+        max_file_size=50000000,
+        max_total_size=500000000,
+    ):
+        self.disk_folder = disk_folder
+        self.memory_folder = memory_folder
+        self.max_file_size = max_file_size
+        if memory_folder:
+            # Leave room for anything else using the memory backed filesystem
+            max_total_size = min(max_total_size, disk_usage(memory_folder).free // 2)
+        self.max_total_size = max_total_size
+        self.total_size = 0
+        self.sizes = {}
+        self.lock = Lock()
+        self.spilled = 0
+
+    @classmethod
+    def from_configuration(cls, configuration, disk_folder, name):
+        """Resource files stay on disk if memory buffers are turned off, if
+        resource files are to be kept or if there is no memory backed
+        filesystem. Otherwise they are written to a folder called name in the
+        memory backed filesystem."""
+        memory_folder = configuration.get("memory_folder", "/dev/shm")
+        if not configuration.get("memory_buffers", True) or configuration.get(
+            "keep_resource_files", False
+        ):
+            memory_folder = None
+        elif not isdir(memory_folder):
+            logger.info(f"No memory folder {memory_folder} so writing to disk")
+            memory_folder = None
+        else:
+            memory_folder = get_temp_dir(name, tempdir=memory_folder)
+        return cls(
+            disk_folder,
+            memory_folder,
+            configuration.get("memory_buffer_max_file_size", 50000000),
+            configuration.get("memory_buffer_max_total_size", 500000000),
+        )
+
+    def has_room(self):
+        """Whether another file of up to the maximum size fits in memory,
+        going by the files kept there and by the free space of the memory
+        backed filesystem, which includes files written but not yet placed"""
+        with self.lock:
+            if self.total_size + self.max_file_size > self.max_total_size:
+                return False
+        return disk_usage(self.memory_folder).free >= self.max_file_size
+
+    def get_disk_folder(self, name):
+        folder = join(self.disk_folder, name)
+        makedirs(folder, exist_ok=True)
+        return folder
+
+    def get_folder(self, name):
+        """Folder to which to write resource files of name (eg. country ISO3).
+        This is decided before the files are written so that they go to disk
+        if there is not room for them in memory."""
+        if not self.memory_folder or not self.has_room():
+            return self.get_disk_folder(name)
+        folder = join(self.memory_folder, name)
+        makedirs(folder, exist_ok=True)
+        return folder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def is_in_memory(self, path):
+        if not self.memory_folder:
+            return False
+        return path.startswith(join(self.memory_folder, ""))
+
+    def place(self, dataset):
+        """Keep the dataset's resource files in memory if they fit, otherwise
+        spill them to disk"""
+        for resource in dataset.get_resources():
+            path = resource.get_file_to_upload()
+            if not path or not self.is_in_memory(path):
+                continue
+            size = getsize(path)
+            with self.lock:
+                if path in self.sizes:
+                    continue
+                if (
+                    size <= self.max_file_size
+                    and self.total_size + size <= self.max_total_size
+                ):
+                    self.sizes[path] = size
+                    self.total_size += size
+                    continue
+                self.spilled += 1
+            disk_path = join(self.disk_folder, relpath(path, self.memory_folder))
+            makedirs(dirname(disk_path), exist_ok=True)
+            move(path, disk_path)
+            resource.set_file_to_upload(disk_path)
+
+    def release(self, dataset):
+        """Delete the dataset's resource files that are in memory. This is
+        called once an upload has finished, including after its retries have
+        failed, in which case the whole country is generated again."""
+        for resource in dataset.get_resources():
+            path = resource.get_file_to_upload()
+            if not path or not self.is_in_memory(path):
+                continue
+            with self.lock:
+                size = self.sizes.pop(path, None)
+                if size is not None:
+                    self.total_size -= size
+            if exists(path):
+                remove(path)
+
+    def close(self):
+        if self.memory_folder:
+            logger.info(f"Spilled {self.spilled} resource files to disk")
+            rmtree(self.memory_folder, ignore_errors=True)
@@ -0,0 +1,38 @@
+#!/usr/bin/python
+"""
+Decoding:
+--------
+
+Decodes JSON from the raw bytes of World Bank API responses. orjson is used
+if it is installed as it is faster than the standard library on large
+responses, otherwise the standard library is used.
+
+"""
+
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_loads(backend="auto"):
+    """Function that decodes JSON from bytes using backend which is orjson,
+    json (the standard library) or auto for orjson if it is installed"""
+    if backend == "auto":
+        if orjson is None:
+            backend = "json"
+        else:
+            backend = "orjson"
+    if backend == "orjson":
+        if orjson is None:
+            logger.warning("orjson is not installed so using json")
+            return json.loads
+        return orjson.loads
+    if backend == "json":
+        return json.loads
+    raise ValueError(f"Unknown JSON backend {backend}!")
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+"""
+HDX State:
+---------
+
+In-memory index of the World Bank datasets and showcases that already exist in
+HDX, prefetched with a few paginated searches so that uploads need not read
+each object before writing it.
+
+"""
+
+import logging
+from copy import deepcopy
+from threading import Lock
+
+from hdx.data.dataset import Dataset
+from hdx.data.showcase import Showcase
+
+logger = logging.getLogger(__name__)
+
+showcase_fields = ("title", "notes", "url", "image_url")
+
+
+class IndexedDataset(Dataset):
+    """Dataset whose lookup of the existing dataset in create_in_hdx is served
+    from an HDXState index if one has been attached"""
+
+    hdx_state = None
+
+    def _dataset_load_from_hdx(self, id_or_name):
+        if self.hdx_state is None:
+            return super()._dataset_load_from_hdx(id_or_name)
+        return self.hdx_state.load_dataset(self, id_or_name)
+
+
+class HDXState:
+    def __init__(self, datasets=None, showcases=None):
+        self.datasets = {}
+        self.showcases = {}
+        self.misses = set()
+        self.lock = Lock()
+        for dataset in datasets or []:
+            self.add_dataset(dataset)
+        for showcase in showcases or []:
+            self.add_showcase(showcase)
+
+    @classmethod
+    def prefetch(cls, organisation, showcase_query, configuration=None):
+        datasets = []
+        for dataset in Dataset.search_in_hdx(
+            configuration=configuration, fq=f"owner_org:{organisation}"
+        ):
+            data = dataset.data
+            data["resources"] = [x.data for x in dataset.get_resources()]
+            datasets.append(data)
+        showcases = [
+            showcase.data
+            for showcase in Showcase.search_in_hdx(
+                configuration=configuration, fq=showcase_query
+            )
+        ]
+        logger.info(
+            f"Prefetched {len(datasets)} datasets and {len(showcases)} showcases from HDX"
+        )
+        return cls(datasets, showcases)
+
+    def add_dataset(self, data):
+        if isinstance(data, Dataset):
+            resources = [x.data for x in data.get_resources()]
+            data = deepcopy(data.data)
+            data["resources"] = resources
+        with self.lock:
+            self.datasets[data["name"]] = data
+            if "id" in data:
+                self.datasets[data["id"]] = data
+
+    def add_showcase(self, data):
+        if isinstance(data, Showcase):
+            data = deepcopy(data.data)
+        with self.lock:
+            self.showcases[data["name"]] = data
+
+    def get_dataset(self, id_or_name):
+        return self.datasets.get(id_or_name)
+
+    def get_showcase(self, name):
+        return self.showcases.get(name)
+
+    def first_miss(self, id_or_name):
+        """Returns True the first time a lookup misses the index. A second
+        miss for the same object (eg. on retry) should go to HDX in case the
+        object was created after the prefetch."""
+        with self.lock:
+            if id_or_name in self.misses:
+                return False
+            self.misses.add(id_or_name)
+            return True
+
+    def load_dataset(self, dataset, id_or_name):
+        data = self.get_dataset(id_or_name)
+        if data is None:
+            if self.first_miss(id_or_name):
+                return False
+            return Dataset._dataset_load_from_hdx(dataset, id_or_name)
+        dataset.old_data = dataset.data
+        dataset.data = deepcopy(data)
+        dataset._dataset_create_resources()
+        return True
+
+    def attach_dataset(self, dataset):
+        """Serve the existing dataset lookup in create_in_hdx of dataset, an
+        IndexedDataset, from the index"""
+        if not isinstance(dataset, IndexedDataset):
+            raise TypeError(f"{dataset['name']} is not an IndexedDataset!")
+        dataset.hdx_state = self
+
+    def is_showcase_unchanged(self, showcase):
+        existing = self.get_showcase(showcase["name"])
+        if existing is None:
+            return False
+        for field in showcase_fields:
+            if showcase.data.get(field) != existing.get(field):
+                return False
+        existing_tags = sorted(x["name"] for x in existing.get("tags", []))
+        return existing_tags == sorted(showcase.get_tags())
+
+    def create_showcase(self, showcase):
+        """Create or update showcase in HDX unless it is unchanged. Returns
+        the datasets to check when linking: an empty list if the showcase is
+        new, otherwise None so that they are read from HDX."""
+        name = showcase["name"]
+        existing = self.get_showcase(name)
+        if existing is not None and self.is_showcase_unchanged(showcase):
+            showcase.data = deepcopy(existing)
+            return None
+        new = existing is None and self.first_miss(name)
+        showcase.create_in_hdx()
+        self.add_showcase(showcase)
+        if new:
+            return []
+        return None
@@ -0,0 +1,85 @@
+#!/usr/bin/python
+"""
+HTTP cache:
+----------
+
+Stores the ETag and Last-Modified validators of responses with their bodies
+per URL so that later runs can make conditional requests. A response of 304
+Not Modified is then served from the stored body. Bodies are compressed as
+World Bank API responses are large and compress well.
+
+"""
+
+import logging
+import zlib
+from hashlib import sha256
+from os import makedirs
+from os.path import exists, join
+from threading import Lock
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+class ValidatorCache:
+    def __init__(self, folder):
+        self.folder = folder
+        makedirs(folder, exist_ok=True)
+        self.lock = Lock()
+        self.not_modified = 0
+        self.modified = 0
+
+    @staticmethod
+    def get_key(url):
+        return sha256(url.encode("utf-8")).hexdigest()
+
+    def get_paths(self, url):
+        key = self.get_key(url)
+        return join(self.folder, f"{key}.json"), join(self.folder, f"{key}.zlib")
+
+    def get_headers(self, url):
+        """Conditional request headers for url or None if nothing is stored"""
+        validators_path, body_path = self.get_paths(url)
+        if not exists(validators_path) or not exists(body_path):
+            return None
+        validators = load_json(validators_path)
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def get_content(self, url):
+        """Stored body of url"""
+        _, body_path = self.get_paths(url)
+        with open(body_path, "rb") as f:
+            content = zlib.decompress(f.read())
+        with self.lock:
+            self.not_modified += 1
+        return content
+
+    def save(self, url, headers, content):
+        """Store the validators in response headers and the body of url if
+        there are any validators"""
+        with self.lock:
+            self.modified += 1
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+        validators_path, body_path = self.get_paths(url)
+        with open(body_path, "wb") as f:
+            f.write(zlib.compress(content, 1))
+        save_json(
+            {"url": url, "etag": etag, "last_modified": last_modified},
+            validators_path,
+        )
+
+    def log_summary(self):
+        logger.info(
+            f"{self.not_modified} responses not modified and served from the "
+            f"cache, {self.modified} downloaded"
+        )
@@ -0,0 +1,79 @@
+#!/usr/bin/python
+"""
+Parquet:
+-------
+
+Optional columnar export of the combined datasets. Each country's rows are
+written to indicators_{iso3}.parquet in the country's folder with the
+country and indicator columns dictionary encoded and the year and value typed.
+The rows of all countries can also be written to one Parquet dataset
+partitioned by country ISO3. Needs pyarrow which is an optional dependency.
+
+"""
+
+import logging
+from os import makedirs
+from os.path import join
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_schema():
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            ("Country Name", text),
+            ("Country ISO3", text),
+            ("Year", pa.int16()),
+            ("Indicator Name", text),
+            ("Indicator Code", text),
+            ("Value", pa.float64()),
+        ]
+    )
+
+
+class ParquetExport:
+    all_countries_name = "indicators"
+
+    def __init__(self, folder, all_countries=True):
+        self.folder = folder
+        self.all_countries = all_countries
+        self.schema = get_schema()
+
+    @classmethod
+    def from_configuration(cls, configuration, folder):
+        """Returns None if export is turned off or pyarrow is not installed"""
+        if not configuration.get("parquet_export", False):
+            return None
+        if pa is None:
+            logger.warning("pyarrow is not installed so not exporting Parquet")
+            return None
+        return cls(folder, configuration.get("parquet_all_countries", True))
+
+    def get_table(self, rows):
+        columns = {name: [row[name] for row in rows] for name in self.schema.names}
+        return pa.Table.from_pydict(columns, schema=self.schema)
+
+    def write(self, countryiso, rows):
+        """Write rows of country to its Parquet file and to the country's
+        partition of the all countries dataset"""
+        table = self.get_table(rows)
+        folder = join(self.folder, countryiso)
+        makedirs(folder, exist_ok=True)
+        pq.write_table(table, join(folder, f"indicators_{countryiso}.parquet"))
+        if not self.all_countries:
+            return
+        # Hive partitioning so readers get Country ISO3 from the folder name
+        folder = join(
+            self.folder, self.all_countries_name, f"Country ISO3={countryiso}"
+        )
+        makedirs(folder, exist_ok=True)
+        pq.write_table(
+            table.drop_columns(["Country ISO3"]), join(folder, "part-0.parquet")
+        )
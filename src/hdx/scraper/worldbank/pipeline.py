@@ -9,6 +9,12 @@ Generates World Bank datasets.
 
 import logging
 import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from copy import deepcopy
+from functools import cache
+from os import remove
+from os.path import exists
 
 from hdx.data.dataset import Dataset
 from hdx.data.hdxobject import HDXError
@@ -16,6 +22,10 @@ from hdx.data.showcase import Showcase
 from hdx.utilities.dictandlist import dict_of_lists_add
 from slugify import slugify
 
+from hdx.scraper.worldbank.hdx_state import IndexedDataset
+from hdx.scraper.worldbank.refresh import is_topic_updated
+from hdx.scraper.worldbank.writer import generate_resources
+
 logger = logging.getLogger(__name__)
 headers = [
     "Country Name",
@@ -33,10 +43,16 @@ hxltags = {
     "Indicator Code": "#indicator+code",
     "Value": "#indicator+value+num",
 }
+# World Bank API errors for an invalid or deleted indicator
+indicator_error_ids = {"120", "175"}
+indicator_error_keys = {"Invalid value", "Indicator deleted or archived"}
 resource_name = "%s Indicators for %s"
 
 
-def get_topics(base_url, downloader):
+def get_topics(base_url, downloader, lastupdated=None):
+    """Get topics with their indicators by source. If lastupdated, a
+    dictionary, is given, the last updated date of each source is added to
+    it."""
     url = f"{base_url}v2/en/source?format=json&per_page=10000"
     response = downloader.download(url)
     json = response.json()
@@ -47,6 +63,8 @@ def get_topics(base_url, downloader):
         if "archive" in source["name"].lower():
             continue
         valid_sources.append(source["id"])
+        if lastupdated is not None:
+            lastupdated[source["id"]] = source["lastupdated"]
     url = f"{base_url}v2/en/topic?format=json&per_page=10000"
     response = downloader.download(url)
     json = response.json()
@@ -139,23 +157,178 @@ def get_combined_dataset_name(countryname):
     return slugify(f"World Bank Combined Indicators for {countryname}").lower()
 
 
+@cache
+def get_hdx_location(countryiso):
+    """Get HDX location code and error message (one of which is None) for a
+    country ISO3 code. Results are cached so that each country is only looked
+    up once per run."""
+    dataset = Dataset()
+    try:
+        dataset.add_country_location(countryiso)
+    except HDXError as e:
+        return None, str(e)
+    return dataset["groups"][0]["name"], None
+
+
+def add_country_location(dataset, countryiso):
+    """Add country location to dataset using the cached HDX location"""
+    hdx_code, error = get_hdx_location(countryiso)
+    if error:
+        raise HDXError(error)
+    groups = dataset.get("groups") or []
+    if hdx_code not in [x["name"] for x in groups]:
+        groups.append({"name": hdx_code})
+    dataset["groups"] = groups
+
+
+def get_valid_countries(countries):
+    """Get countries that are valid HDX locations logging those that are not"""
+    valid_countries = []
+    for country in countries:
+        _, error = get_hdx_location(country["iso3"])
+        if error:
+            logger.error(f"{country['name']} has a problem! {error}")
+            continue
+        valid_countries.append(country)
+    return valid_countries
+
+
+@cache
+def get_fixed_metadata():
+    """Get metadata that is the same for all datasets. It is set and validated
+    once and copied into each dataset."""
+    dataset = Dataset()
+    dataset.set_maintainer("085d3bd8-9035-4b0e-9d2d-80e849dd7b07")
+    dataset.set_organization("905a9a49-5325-4a31-a9d7-147a60a8387c")
+    dataset.set_subnational(False)
+    dataset.set_expected_update_frequency("Every month")
+    return dataset.data
+
+
+@cache
+def get_mapped_tags(tags):
+    """Get tags (a tuple) mapped to HDX approved tags in the form stored in
+    datasets and showcases. Mapping is done once per distinct tuple."""
+    dataset = Dataset()
+    dataset.add_tags(list(tags))
+    return dataset.get("tags", [])
+
+
+def add_tags(hdxobject, tags):
+    """Add tags to dataset or showcase reusing the mapped tags of earlier
+    objects with the same tags"""
+    if hdxobject.get("tags"):
+        hdxobject.add_tags(tags)
+        return
+    hdxobject["tags"] = deepcopy(get_mapped_tags(tuple(tags)))
+
+
+@cache
+def get_topic_slug(topicname):
+    return slugify(topicname)
+
+
 def get_dataset(slugified_name, title, countryiso=None):
-    dataset = Dataset(
+    dataset = IndexedDataset(
         {
             "name": slugified_name,
             "title": title,
+            **get_fixed_metadata(),
         }
     )
-    dataset.set_maintainer("085d3bd8-9035-4b0e-9d2d-80e849dd7b07")
-    dataset.set_organization("905a9a49-5325-4a31-a9d7-147a60a8387c")
-    dataset.set_subnational(False)
-    dataset.set_expected_update_frequency("Every month")
     if countryiso:
-        dataset.add_country_location(countryiso)
+        add_country_location(dataset, countryiso)
     return dataset
 
 
-def generate_dataset_and_showcase(configuration, downloader, folder, country, topic):
+def get_indicator_batches(indicator_list, indicator_limit, character_limit):
+    """Split indicators into batches of at most indicator_limit indicators
+    whose codes joined by semicolons are at most character_limit long"""
+    batches = []
+    indicator_list_len = len(indicator_list)
+    i = 0
+    while i < indicator_list_len:
+        ie = min(i + indicator_limit, indicator_list_len)
+        while (
+            ie > i + 1
+            and len(";".join([x["id"] for x in indicator_list[i:ie]])) > character_limit
+        ):
+            ie -= 1
+        batches.append(indicator_list[i:ie])
+        i = ie
+    return batches
+
+
+def is_indicator_error(message):
+    """Whether the message of a failed World Bank API request says that an
+    indicator in it is invalid or no longer available"""
+    return any(
+        x.get("id") in indicator_error_ids or x.get("key") in indicator_error_keys
+        for x in message
+    )
+
+
+def get_qc_indicators(indicators_len_dict, indicator_names_dict):
+    """Get up to 3 indicators for QuickCharts preferring shorter indicator
+    codes and leaving out indicators whose values do not change"""
+    qc_indicators = [None, None, None]
+    for len_indicator_code in sorted(indicators_len_dict):
+        indicators_dict = indicators_len_dict[len_indicator_code]
+        for indicator_code in indicators_dict:
+            ind_year_values = indicators_dict[indicator_code]
+            if len(set(ind_year_values.values())) == 1:
+                continue
+            indicator_name = indicator_names_dict[indicator_code]
+            if qc_indicators[0] is None:
+                qc_indicators[0] = {
+                    "code": indicator_code,
+                    "title": indicator_name,
+                    "unit": get_unit(indicator_name),
+                }
+            elif qc_indicators[1] is None:
+                qc_indicators[1] = {
+                    "code": indicator_code,
+                    "title": indicator_name,
+                    "unit": get_unit(indicator_name),
+                }
+            elif qc_indicators[2] is None:
+                qc_indicators[2] = {
+                    "code": indicator_code,
+                    "title": indicator_name,
+                    "unit": get_unit(indicator_name),
+                }
+    return qc_indicators
+
+
+def get_indicator_short_names(indicator_names):
+    """Get indicator names without the parts after a comma, bracket or
+    colon"""
+    short_names = set()
+    for indicator_name_long in indicator_names:
+        ind0 = re.sub(r"\s+", " ", indicator_name_long)
+        ind1, _, _ = ind0.partition(",")
+        ind2, _, _ = ind1.partition("(")
+        indicator_name, _, _ = ind2.partition(":")
+        short_names.add(indicator_name.strip())
+    return short_names
+
+
+def generate_dataset_and_showcase(
+    configuration,
+    downloader,
+    folder,
+    country,
+    topic,
+    availability=None,
+    denylist=None,
+    warehouse=None,
+    offline=False,
+    disk_folder=None,
+):
+    """Generate topic dataset and showcase. Observations are read from
+    warehouse instead of the World Bank API if offline or the warehouse is
+    offline. Resource files are written to disk_folder if given and folder
+    is in memory that fills up."""
     countryname = country["name"]
     topicname = topic["value"]
     title = f"{countryname} - {topicname}"
@@ -178,10 +351,9 @@ def generate_dataset_and_showcase(configuration, downloader, folder, country, to
     tags.add("hxl")
     tags.add("indicators")
     tags = sorted(tags)
-    dataset.add_tags(tags)
+    add_tags(dataset, tags)
 
     years = set()
-    qc_indicators = [None, None, None]
     indicator_names_dict = {}
     indicators_len_dict = {}
     rows = []
@@ -217,30 +389,70 @@ def generate_dataset_and_showcase(configuration, downloader, folder, country, to
     indicator_limit = configuration["indicator_limit"]
     character_limit = configuration["character_limit"]
     start_url = f"{base_url}v2/en/country/{countryiso}/indicator/"
-    for source_id in topic["sources"]:
-        indicator_list = topic["sources"][source_id]
-        indicator_list_len = len(indicator_list)
-        i = 0
-        while i < indicator_list_len:
-            ie = min(i + indicator_limit, indicator_list_len)
-            indicators_string = ";".join([x["id"] for x in indicator_list[i:ie]])
-            if len(indicators_string) > character_limit:
-                while len(indicators_string) > character_limit:
-                    ie -= 1
-                    indicators_string = ";".join(
-                        [x["id"] for x in indicator_list[i:ie]]
-                    )
-                i = ie - indicator_limit
+    if warehouse and (offline or warehouse.offline):
+        # Generate from the warehouse so there are no sources to request
+        for indicator_list in topic["sources"].values():
+            add_rows(
+                warehouse.get_observations(
+                    countryiso, [x["id"] for x in indicator_list]
+                )
+            )
+        sources = {}
+    else:
+        sources = topic["sources"]
+    for source_id in sources:
+        indicator_list = sources[source_id]
+        if denylist:
+            indicator_list = denylist.filter(countryiso, indicator_list)
+        if availability:
+            indicator_list = availability.filter(countryiso, indicator_list)
+        batches = get_indicator_batches(
+            indicator_list, indicator_limit, character_limit
+        )
+        while batches:
+            batch = batches.pop(0)
+            indicators_string = ";".join([x["id"] for x in batch])
             url = f"{start_url}{indicators_string}?source={source_id}&format=json&per_page=10000"
             response = downloader.download(url)
             json = response.json()
-            if "message" in json[0] or json[0]["total"] == 0:
-                i += indicator_limit
+            if "message" in json[0]:
+                if not is_indicator_error(json[0]["message"]):
+                    # Not caused by particular indicators so bisecting would
+                    # only repeat it and wrongly deny list the whole batch
+                    logger.error(
+                        f"{countryname} request from source {source_id} failed! {json[0]['message']}"
+                    )
+                    continue
+                # Bisect failing batch so that only the indicators causing
+                # the failure are lost
+                if len(batch) == 1:
+                    indicator_code = batch[0]["id"]
+                    logger.warning(
+                        f"{countryname} request for {indicator_code} from source {source_id} failed!"
+                    )
+                    if denylist:
+                        denylist.add(countryiso, indicator_code)
+                else:
+                    half = len(batch) // 2
+                    batches[:0] = [batch[:half], batch[half:]]
                 continue
-            if json[0]["pages"] != 1:
-                raise ValueError("Not expecting more than one page!")
-            add_rows(json[1])
-            i += indicator_limit
+            if json[0]["total"] == 0:
+                jsondata = []
+            else:
+                if json[0]["pages"] != 1:
+                    raise ValueError("Not expecting more than one page!")
+                jsondata = json[1]
+                add_rows(jsondata)
+            if warehouse:
+                warehouse.save_observations(
+                    countryiso, [x["id"] for x in batch], jsondata
+                )
+            if availability:
+                availability.record(
+                    countryiso,
+                    [x["id"] for x in batch],
+                    {x["indicator"]["id"] for x in jsondata if x["value"] is not None},
+                )
 
     if len(years) == 0:
         logger.error(f"{title} has no data!")
@@ -254,41 +466,10 @@ def generate_dataset_and_showcase(configuration, downloader, folder, country, to
     ]
     dataset["notes"] = "".join(notes)
 
-    for len_indicator_code in sorted(indicators_len_dict):
-        indicators_dict = indicators_len_dict[len_indicator_code]
-        for indicator_code in indicators_dict:
-            ind_year_values = indicators_dict[indicator_code]
-            if len(set(ind_year_values.values())) == 1:
-                continue
-            indicator_name = indicator_names_dict[indicator_code]
-            if qc_indicators[0] is None:
-                qc_indicators[0] = {
-                    "code": indicator_code,
-                    "title": indicator_name,
-                    "unit": get_unit(indicator_name),
-                }
-            elif qc_indicators[1] is None:
-                qc_indicators[1] = {
-                    "code": indicator_code,
-                    "title": indicator_name,
-                    "unit": get_unit(indicator_name),
-                }
-            elif qc_indicators[2] is None:
-                qc_indicators[2] = {
-                    "code": indicator_code,
-                    "title": indicator_name,
-                    "unit": get_unit(indicator_name),
-                }
-
-    indicator_names = set()
-    for indicator_name_long in indicator_names_dict.values():
-        ind0 = re.sub(r"\s+", " ", indicator_name_long)
-        ind1, _, _ = ind0.partition(",")
-        ind2, _, _ = ind1.partition("(")
-        indicator_name, _, _ = ind2.partition(":")
-        indicator_names.add(indicator_name.strip())
+    qc_indicators = get_qc_indicators(indicators_len_dict, indicator_names_dict)
+    indicator_names = get_indicator_short_names(indicator_names_dict.values())
 
-    slug_topicname = slugify(topicname)
+    slug_topicname = get_topic_slug(topicname)
     filename = f"{slug_topicname}_{countryiso}.csv"
     res_name = resource_name % (topicname, countryname)
     resourcedata = {
@@ -303,8 +484,16 @@ def generate_dataset_and_showcase(configuration, downloader, folder, country, to
         "cutdown": 2,
         "cutdownhashtags": ["#indicator+code", "#country+code", "#date+year"],
     }
-    success, result = dataset.generate_resource_from_iterable(
-        headers, rows, hxltags, folder, filename, resourcedata, quickcharts=quickcharts
+    success, result = generate_resources(
+        dataset,
+        headers,
+        rows,
+        hxltags,
+        folder,
+        filename,
+        resourcedata,
+        quickcharts,
+        disk_folder,
     )
     if success is False:
         logger.warning(f"{title} has no data!")
@@ -320,12 +509,21 @@ def generate_dataset_and_showcase(configuration, downloader, folder, country, to
             "image_url": "https://www.worldbank.org/content/dam/wbr/logo/logo-wb-header-en.svg",
         }
     )
-    showcase.add_tags(tags)
+    add_tags(showcase, tags)
     return dataset, showcase, qc_indicators, years, result["rows"]
 
 
 def generate_combined_dataset_and_showcase(
-    configuration, folder, country, tags, topics, ignore_topics, allyears, rows
+    configuration,
+    folder,
+    country,
+    tags,
+    topics,
+    ignore_topics,
+    allyears,
+    rows,
+    parquet=None,
+    disk_folder=None,
 ):
     indicators = (
         "Economic, Social, Environmental, Health, Education, Development and Energy"
@@ -340,7 +538,7 @@ def generate_combined_dataset_and_showcase(
     except HDXError as e:
         logger.exception(f"{countryname} has a problem! {e}")
         return None, None, None
-    dataset.add_tags(tags)
+    add_tags(dataset, tags)
     topiclist = []
     for topic in topics:
         topicname = topic["value"]
@@ -369,12 +567,22 @@ def generate_combined_dataset_and_showcase(
         "cutdown": 2,
         "cutdownhashtags": ["#indicator+code", "#country+code", "#date+year"],
     }
-    success, results = dataset.generate_resource_from_iterable(
-        headers, rows, hxltags, folder, filename, resourcedata, quickcharts=quickcharts
+    success, results = generate_resources(
+        dataset,
+        headers,
+        rows,
+        hxltags,
+        folder,
+        filename,
+        resourcedata,
+        quickcharts,
+        disk_folder,
     )
     if success is False:
         logger.warning(f"{title} has no data!")
         return None, None, None
+    if parquet:
+        parquet.write(countryiso, rows)
 
     dataset.set_time_period_year_range(allyears)
 
@@ -387,30 +595,99 @@ def generate_combined_dataset_and_showcase(
             "image_url": "https://www.worldbank.org/content/dam/wbr/logo/logo-wb-header-en.svg",
         }
     )
-    showcase.add_tags(tags)
+    add_tags(showcase, tags)
 
     return dataset, showcase, results["bites_disabled"]
 
 
+def remove_resource_files(dataset):
+    """Delete the resource files of a dataset that will not be created so
+    they do not build up in the memory backed folder"""
+    for resource in dataset.get_resources():
+        path = resource.get_file_to_upload()
+        if path and exists(path):
+            remove(path)
+
+
 def generate_all_datasets_showcases(
-    configuration, downloader, folder, country, topics, create_dataset_showcase, batch
+    configuration,
+    downloader,
+    folder,
+    country,
+    topics,
+    create_dataset_showcase,
+    batch,
+    availability=None,
+    denylist=None,
+    topline=None,
+    parquet=None,
+    profiler=None,
+    warehouse=None,
+    updated_sources=None,
+    disk_folder=None,
 ):
+    """Generate topic datasets and the combined dataset of country. If
+    updated_sources is given, only topic datasets with indicators from those
+    sources are created and the rows of the other topics are read from the
+    warehouse if there is one for the combined dataset. The resource files of
+    the other topics are deleted since they are not created. Topics are generated
+    concurrently by up to topic_workers threads but their results are used in
+    topic order so the output does not depend on which finishes first.
+    Resource files are written to disk_folder if given and folder is in memory
+    that fills up."""
     allrows = []
     alltags = set()
     allyears = set()
     ignore_topics = []
-    for topic in topics:
-        dataset, showcase, qc_indicators, years, rows = generate_dataset_and_showcase(
-            configuration, downloader, folder, country, topic
-        )
-        if dataset is None:
-            ignore_topics.append(rows)
+    if not any(is_topic_updated(x, updated_sources) for x in topics):
+        logger.info(f"No sources updated for {country['name']}")
+        return None, None, None
+
+    def generate_topic(topic):
+        if profiler:
+            profile = profiler.profile_topic(country["iso3"], topic["value"])
         else:
-            logger.info(f"Adding {country['name']} {topic['value']}")
+            profile = nullcontext()
+        with profile:
+            return generate_dataset_and_showcase(
+                configuration,
+                downloader,
+                folder,
+                country,
+                topic,
+                availability,
+                denylist,
+                warehouse,
+                not is_topic_updated(topic, updated_sources),
+                disk_folder,
+            )
+
+    topic_workers = configuration.get("topic_workers", 1)
+    if topic_workers > 1 and not profiler:
+        executor = ThreadPoolExecutor(max_workers=topic_workers)
+        results = executor.map(generate_topic, topics)
+    else:
+        # Profiles cannot be collected per topic across threads
+        executor = nullcontext()
+        results = map(generate_topic, topics)
+    with executor:
+        for topic, result in zip(topics, results):
+            dataset, showcase, qc_indicators, years, rows = result
+            if dataset is None:
+                ignore_topics.append(rows)
+                continue
             allrows.extend(rows[1:])
             alltags.update(dataset.get_tags())
             allyears.update(years)
-            create_dataset_showcase(dataset, showcase, qc_indicators, batch)
+            if is_topic_updated(topic, updated_sources):
+                logger.info(f"Adding {country['name']} {topic['value']}")
+                create_dataset_showcase(dataset, showcase, qc_indicators, batch)
+            else:
+                remove_resource_files(dataset)
+    if topline is not None:
+        topline[country["iso3"]] = get_latest_rows(
+            allrows, configuration["topline_indicators"]
+        )
     if len(ignore_topics) == len(topics):
         return None, None, None
     return generate_combined_dataset_and_showcase(
@@ -422,21 +699,69 @@ def generate_all_datasets_showcases(
         ignore_topics,
         allyears,
         allrows,
+        parquet,
+        disk_folder,
     )
 
 
+def get_latest_rows(rows, indicator_codes):
+    """Get the row with the latest year for each of indicator_codes"""
+    indicator_codes = set(indicator_codes)
+    latest_rows = {}
+    for row in rows:
+        indicator_code = row["Indicator Code"]
+        if indicator_code not in indicator_codes:
+            continue
+        latest_row = latest_rows.get(indicator_code)
+        if latest_row is None or row["Year"] > latest_row["Year"]:
+            latest_rows[indicator_code] = row
+    return latest_rows
+
+
+def get_topline_from_rows(countries, topline_indicators, topline):
+    """Get topline values in the form returned by the World Bank API from the
+    latest rows of each country"""
+    jsondata = []
+    for indicator_code in topline_indicators:
+        for country in countries:
+            row = topline.get(country["iso3"], {}).get(indicator_code)
+            if row is None:
+                continue
+            jsondata.append(
+                {
+                    "indicator": {
+                        "id": indicator_code,
+                        "value": row["Indicator Name"],
+                    },
+                    "countryiso3code": country["iso3"],
+                    "date": str(row["Year"]),
+                    "value": row["Value"],
+                }
+            )
+    return jsondata
+
+
 def generate_topline_dataset(
-    base_url, downloader, folder, countries, topline_indicators
+    base_url, downloader, folder, countries, topline_indicators, topline=None
 ):
+    """Generate topline dataset. If topline, a dictionary from country ISO3
+    code to latest rows by indicator code, is given, it is used instead of
+    requesting the latest values from the World Bank API."""
     tlstr = ";".join(topline_indicators)
     url = f"{base_url}v2/en/country/all/indicator/{tlstr}?source=2&mrnev=1&format=json&per_page=10000"
-    response = downloader.download(url)
-    json = response.json()
-    if json[0]["total"] == 0:
-        raise ValueError("No values returned!")
-    if json[0]["pages"] != 1:
-        raise ValueError("Not expecting more than one page!")
-    allcountryisos = [x["iso3"] for x in countries]
+    if topline is None:
+        response = downloader.download(url)
+        json = response.json()
+        if json[0]["total"] == 0:
+            raise ValueError("No values returned!")
+        if json[0]["pages"] != 1:
+            raise ValueError("Not expecting more than one page!")
+        jsondata = json[1]
+    else:
+        jsondata = get_topline_from_rows(countries, topline_indicators, topline)
+        if not jsondata:
+            raise ValueError("No values returned!")
+    allcountryisos = {x["iso3"] for x in countries}
     headers = ["countryiso", "indicator", "source", "url", "date", "unit", "value"]
     rows = [
         {
@@ -455,12 +780,12 @@ def generate_topline_dataset(
 
     dataset = get_dataset(slugified_name, title)
     years = set()
-    for row in json[1]:
+    for row in jsondata:
         countryiso = row["countryiso3code"]
         if countryiso not in allcountryisos:
             continue
         try:
-            dataset.add_country_location(countryiso)
+            add_country_location(dataset, countryiso)
         except HDXError:
             continue
         indicator_name = row["indicator"]["value"]
@@ -480,7 +805,7 @@ def generate_topline_dataset(
         rows.append(topline_indicator)
 
     dataset.set_time_period_year_range(years)
-    dataset.add_tags(["indicators"])
+    add_tags(dataset, ["indicators"])
 
     resourcedata = {
         "name": "topline_indicators",
@@ -0,0 +1,119 @@
+#!/usr/bin/python
+"""
+Planner:
+-------
+
+Fits a run into a maintenance window ending at a wall-clock deadline. Before
+each country, the time left for the remaining countries is estimated from
+the time each took in previous runs scaled by the throughput observed so far
+in this run. If the estimate goes past the deadline, the topic datasets of
+the country are deferred so that only its combined dataset is created in HDX.
+Countries with deferred topic datasets are saved and go first in the next
+run.
+
+"""
+
+import logging
+from datetime import datetime, timezone
+from os.path import exists, join
+from time import time
+
+from hdx.utilities.dateparse import parse_date
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+def get_deadline(value, now=None):
+    """Deadline in seconds since the epoch from a number of minutes from now
+    or a date and time (UTC if no timezone is given). None if value is
+    empty."""
+    if not value:
+        return None
+    if now is None:
+        now = time()
+    if isinstance(value, (int, float)) or value.isdigit():
+        return now + float(value) * 60
+    return parse_date(value, timezone_handling=5).timestamp()
+
+
+class RunPlanner:
+    def __init__(self, deadline, costs, path=None):
+        self.deadline = deadline
+        self.costs = costs
+        self.path = path
+        if path and exists(path):
+            self.deferred = set(load_json(path, loaderror_if_empty=False) or [])
+        else:
+            self.deferred = set()
+        self.predicted_seconds = 0.0
+        self.actual_seconds = 0.0
+        self.deferring = False
+
+    def order(self, countries, folder):
+        """Countries with deferred topic datasets first. The order is saved in
+        folder so that a resumed run uses the same order as stored progress
+        relies on it."""
+        order_path = join(folder, "planned_order.json")
+        if exists(order_path):
+            order = load_json(order_path)
+        else:
+            order = [x["iso3"] for x in countries if x["iso3"] in self.deferred]
+            order.extend(x["iso3"] for x in countries if x["iso3"] not in order)
+            save_json(order, order_path)
+        positions = {countryiso: i for i, countryiso in enumerate(order)}
+        return sorted(countries, key=lambda x: positions.get(x["iso3"], len(order)))
+
+    def get_throughput_ratio(self):
+        """Ratio of actual to predicted time of countries processed in full
+        in this run"""
+        if not self.predicted_seconds:
+            return 1.0
+        return self.actual_seconds / self.predicted_seconds
+
+    def estimate(self, countryisos):
+        """Estimated seconds to process countries in full"""
+        return sum(self.costs[x] for x in countryisos) * self.get_throughput_ratio()
+
+    def plan(self, countryiso, remaining, now=None):
+        """Decide whether to defer the topic datasets of countryiso given the
+        remaining countries (including countryiso). Returns True to defer."""
+        if now is None:
+            now = time()
+        estimate = self.estimate(remaining)
+        deferring = now + estimate > self.deadline
+        if deferring != self.deferring:
+            finish = datetime.fromtimestamp(now + estimate, timezone.utc)
+            if deferring:
+                logger.warning(
+                    f"Estimated finish {finish:%H:%M:%S} UTC is after the deadline. "
+                    f"Deferring topic datasets from {countryiso}"
+                )
+            else:
+                logger.info(
+                    f"Estimated finish {finish:%H:%M:%S} UTC is before the deadline. "
+                    f"Creating topic datasets from {countryiso}"
+                )
+            self.deferring = deferring
+        return deferring
+
+    def record(self, countryiso, seconds, deferred):
+        """Record the time taken by countryiso and whether its topic datasets
+        were deferred. Only countries processed in full update the
+        throughput."""
+        if deferred:
+            self.deferred.add(countryiso)
+            return
+        self.deferred.discard(countryiso)
+        self.predicted_seconds += self.costs[countryiso]
+        self.actual_seconds += seconds
+
+    def save(self):
+        if self.deferred:
+            logger.warning(
+                f"Topic datasets of {len(self.deferred)} countries deferred to the "
+                f"next run: {', '.join(sorted(self.deferred))}"
+            )
+        if self.path:
+            save_json(sorted(self.deferred), self.path)
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+"""
+Profiling:
+---------
+
+Opt-in deterministic profiling of the generation of each country and
+optionally of each of its topics. One profile file (readable with pstats or
+tools like snakeviz) is written per country or topic and a summary of the
+functions taking the most time across all countries is logged at the end.
+Only one profile is active at a time, so it is intended for the sequential
+flow in main.
+
+"""
+
+import cProfile
+import logging
+import pstats
+from contextlib import contextmanager, nullcontext
+from io import StringIO
+from os.path import join
+
+from hdx.utilities.path import get_temp_dir
+from slugify import slugify
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    def __init__(self, folder, topics=False, summary_count=30):
+        self.folder = folder
+        self.topics = topics
+        self.summary_count = summary_count
+        # Profiles being run, innermost last, with the files of their inner
+        # profiles
+        self.active = []
+        self.paths = []
+
+    @classmethod
+    def from_configuration(cls, configuration, name):
+        """Returns None if profiling is turned off. Profile files are written
+        to profile_folder or a folder called name in the temporary folder"""
+        if not configuration.get("profile", False):
+            return None
+        folder = configuration.get("profile_folder")
+        if folder:
+            folder = get_temp_dir(tempdir=folder)
+        else:
+            folder = get_temp_dir(name)
+        logger.info(f"Writing profiles to {folder}")
+        return cls(
+            folder,
+            configuration.get("profile_topics", False),
+            configuration.get("profile_summary_count", 30),
+        )
+
+    @contextmanager
+    def profile(self, name):
+        """Profile the code run in the context, writing it to name.prof. An
+        outer profile is paused and its file includes this profile. Profiling
+        name again replaces its earlier profile."""
+        outer = self.active[-1] if self.active else None
+        if outer:
+            outer[0].disable()
+        profile = cProfile.Profile()
+        inner_paths = []
+        self.active.append((profile, inner_paths))
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.active.pop()
+            path = join(self.folder, f"{name}.prof")
+            stats = pstats.Stats(profile)
+            for inner_path in inner_paths:
+                stats.add(inner_path)
+            stats.dump_stats(path)
+            if outer:
+                outer[1].append(path)
+                outer[0].enable()
+            elif path not in self.paths:
+                # A country that is retried keeps the profile of its last
+                # attempt which replaces the file of the earlier one
+                self.paths.append(path)
+
+    def profile_topic(self, countryiso, topicname):
+        if not self.topics:
+            return nullcontext()
+        return self.profile(f"{countryiso}_{slugify(topicname)}")
+
+    def log_summary(self):
+        """Log the functions with the highest own time over all profiles and
+        write the combined profile to summary.prof"""
+        if not self.paths:
+            return
+        output = StringIO()
+        stats = pstats.Stats(*self.paths, stream=output)
+        stats.dump_stats(join(self.folder, "summary.prof"))
+        stats.sort_stats("tottime").print_stats(self.summary_count)
+        logger.info(f"Hot functions:\n{output.getvalue()}")
@@ -0,0 +1,60 @@
+#!/usr/bin/python
+"""
+Refresh:
+-------
+
+Keeps the last updated date of each World Bank source from the previous run
+so that a selective refresh only regenerates the topic datasets with
+indicators from sources updated since then. Whether the observation
+warehouse was filled in that run is also kept, as the rows of the topics
+that have not changed can then be read from it for the combined datasets.
+
+"""
+
+import logging
+from os.path import exists
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+def is_topic_updated(topic, updated_sources):
+    """Whether any indicators of topic are from updated_sources. All topics
+    are updated if updated_sources is None."""
+    if updated_sources is None:
+        return True
+    return any(source_id in updated_sources for source_id in topic["sources"])
+
+
+class SourceUpdates:
+    def __init__(self, path=None):
+        self.path = path
+        if path and exists(path):
+            previous = load_json(path, loaderror_if_empty=False) or {}
+        else:
+            previous = {}
+        self.previous = previous.get("sources", {})
+        self.previous_warehouse = previous.get("warehouse", False)
+        # Filled with the last updated dates of sources by get_topics
+        self.lastupdated = {}
+
+    def get_updated_sources(self):
+        """Ids of sources updated since the previous run or None if there is
+        no previous run or no sources were read in this run"""
+        if not self.previous or not self.lastupdated:
+            return None
+        updated_sources = {
+            source_id
+            for source_id, lastupdated in self.lastupdated.items()
+            if self.previous.get(source_id) != lastupdated
+        }
+        logger.info(
+            f"Sources updated since the previous run: {', '.join(sorted(updated_sources)) or 'none'}"
+        )
+        return updated_sources
+
+    def save(self, warehouse=False):
+        if self.path and self.lastupdated:
+            save_json({"sources": self.lastupdated, "warehouse": warehouse}, self.path)
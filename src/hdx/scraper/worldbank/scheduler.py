@@ -0,0 +1,82 @@
+#!/usr/bin/python
+"""
+Scheduler:
+---------
+
+Orders countries longest first using the time each took in previous runs so
+that, when countries are processed in parallel, the big countries do not
+finish last and leave workers idle. Also predicts the completion time of a
+run so it can be compared with the actual time.
+
+"""
+
+import logging
+from contextlib import contextmanager
+from heapq import heapify, heapreplace
+from os.path import exists
+from threading import Lock
+from time import perf_counter
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+logger = logging.getLogger(__name__)
+
+
+class CountryScheduler:
+    def __init__(self, path=None):
+        self.path = path
+        if path and exists(path):
+            self.costs = load_json(path, loaderror_if_empty=False) or {}
+        else:
+            self.costs = {}
+        self.lock = Lock()
+        self.timings = {}
+
+    def get_default_cost(self):
+        if not self.costs:
+            return 1
+        return sum(self.costs.values()) / len(self.costs)
+
+    def get_costs(self, countries):
+        default_cost = self.get_default_cost()
+        return {x["iso3"]: self.costs.get(x["iso3"], default_cost) for x in countries}
+
+    def order(self, countries):
+        """Countries sorted by decreasing cost. The sort is stable so
+        countries with equal cost keep their order."""
+        costs = self.get_costs(countries)
+        return sorted(countries, key=lambda x: -costs[x["iso3"]])
+
+    def predict(self, countries, workers=1):
+        """Predicted completion time in seconds of processing countries in
+        order on workers, each country going to the first free worker"""
+        costs = self.get_costs(countries)
+        finish_times = [0.0] * max(workers, 1)
+        heapify(finish_times)
+        for country in countries:
+            heapreplace(finish_times, finish_times[0] + costs[country["iso3"]])
+        return max(finish_times)
+
+    @contextmanager
+    def timed(self, countryiso):
+        start = perf_counter()
+        yield
+        with self.lock:
+            self.timings[countryiso] = perf_counter() - start
+
+    def save(self):
+        self.costs.update(self.timings)
+        if self.path:
+            save_json(self.costs, self.path)
+
+    def report(self, predicted, actual):
+        logger.info(f"Predicted completion time {predicted:.0f}s, actual {actual:.0f}s")
+        for countryiso, seconds in sorted(self.timings.items(), key=lambda x: -x[1])[
+            :10
+        ]:
+            previous = self.costs.get(countryiso)
+            if previous is None:
+                logger.info(f"{countryiso}: {seconds:.1f}s (no previous timing)")
+            else:
+                logger.info(f"{countryiso}: {seconds:.1f}s (predicted {previous:.1f}s)")
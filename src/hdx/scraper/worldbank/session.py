@@ -0,0 +1,137 @@
+#!/usr/bin/python
+"""
+Session:
+-------
+
+Pooled HTTP session shared by all workers. Each thread gets its own Download
+object (which holds the current response) but they all share one requests
+session with a sized keep-alive connection pool per host and gzip/deflate
+negotiation. JSON responses are decoded from their raw bytes with the
+configured JSON backend. Requests can be made conditional on validators
+stored in an optional cache.
+
+"""
+
+import logging
+from threading import Lock, local
+
+from hdx.utilities.downloader import Download
+from hdx.utilities.session import get_session
+from requests.adapters import HTTPAdapter
+
+from hdx.scraper.worldbank.decoding import get_loads
+from hdx.scraper.worldbank.httpcache import ValidatorCache
+
+logger = logging.getLogger(__name__)
+
+
+def get_pooled_session(
+    pool_connections=10,
+    pool_maxsize=20,
+    status_forcelist=(400, 429, 500, 502, 503, 504),
+    retry_attempts=5,
+    backoff_factor=1,
+    **kwargs,
+):
+    session = get_session(
+        status_forcelist=status_forcelist,
+        retry_attempts=retry_attempts,
+        backoff_factor=backoff_factor,
+        **kwargs,
+    )
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    session.headers["Connection"] = "keep-alive"
+    retries = session.get_adapter("https://").max_retries
+    # pool_block stops threads opening connections beyond the pool size
+    # which would otherwise be discarded rather than kept alive
+    httpadapter = HTTPAdapter(
+        max_retries=retries,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,
+    )
+    session.mount("http://", httpadapter)
+    session.mount("https://", httpadapter)
+    return session
+
+
+class PooledDownload:
+    """Downloader that can be shared between threads. It has the same
+    download interface as Download, delegating to a Download per thread that
+    uses the shared pooled session."""
+
+    def __init__(self, session, json_backend="auto", cache=None):
+        self.session = session
+        self.loads = get_loads(json_backend)
+        self.cache = cache
+        self.local = local()
+        self.lock = Lock()
+        self.downloaders = []
+
+    @classmethod
+    def from_configuration(cls, configuration, cache_folder=None, threads=1, **kwargs):
+        """Validators are stored in cache_folder if given for conditional
+        requests. The pool holds at least a connection for each of threads,
+        the number of threads making requests at once, since the pool blocks
+        and threads beyond its size would wait for a free connection."""
+        session = get_pooled_session(
+            pool_connections=configuration.get("http_pool_connections", 10),
+            pool_maxsize=max(configuration.get("http_pool_maxsize", 20), threads),
+            status_forcelist=configuration.get(
+                "http_status_forcelist", (400, 429, 500, 502, 503, 504)
+            ),
+            retry_attempts=configuration.get("http_retry_attempts", 5),
+            backoff_factor=configuration.get("http_backoff_factor", 1),
+            **kwargs,
+        )
+        if cache_folder:
+            cache = ValidatorCache(cache_folder)
+        else:
+            cache = None
+        return cls(session, configuration.get("json_backend", "auto"), cache)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_downloader(self):
+        downloader = getattr(self.local, "downloader", None)
+        if downloader is None:
+            downloader = Download(session=self.session)
+            self.local.downloader = downloader
+            with self.lock:
+                self.downloaders.append(downloader)
+        return downloader
+
+    def download(self, url, **kwargs):
+        if not self.cache:
+            response = self.get_downloader().download(url, **kwargs)
+            response.json = lambda **_: self.loads(response.content)
+            return response
+        headers = self.cache.get_headers(url)
+        if headers:
+            headers.update(kwargs.get("headers") or {})
+            kwargs["headers"] = headers
+        response = self.get_downloader().download(url, **kwargs)
+        if response.status_code == 304:
+            content = self.cache.get_content(url)
+        else:
+            content = response.content
+            self.cache.save(url, response.headers, content)
+        response.json = lambda **_: self.loads(content)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.get_downloader(), name)
+
+    def close(self):
+        with self.lock:
+            downloaders = self.downloaders
+            self.downloaders = []
+        for downloader in downloaders:
+            downloader.close_response()
+        self.session.close()
+        if self.cache:
+            self.cache.log_summary()
@@ -0,0 +1,65 @@
+#!/usr/bin/python
+"""
+Sharding:
+--------
+
+Deterministic partitioning of countries into shards so that a run can be
+spread across several machines. Every machine computes the same partition
+from the same country list and processes only the shard selected by its
+index.
+
+"""
+
+import logging
+from zlib import crc32
+
+logger = logging.getLogger(__name__)
+
+
+def get_hash_shard_index(countryiso, shard_count):
+    # crc32 is used rather than hash which is randomised per process
+    return crc32(countryiso.encode("utf-8")) % shard_count
+
+
+def get_balanced_shard_indices(countries, shard_count, costs):
+    """Assign countries to shards largest first, each going to the shard with
+    the lowest total cost so far. Countries without a cost get the mean cost.
+    Ties are broken by ISO3 code and shard index so the result is stable."""
+    if costs:
+        default_cost = sum(costs.values()) / len(costs)
+    else:
+        default_cost = 1
+    countryisos = sorted(
+        (x["iso3"] for x in countries),
+        key=lambda x: (-costs.get(x, default_cost), x),
+    )
+    totals = [0] * shard_count
+    shard_indices = {}
+    for countryiso in countryisos:
+        shard_index = min(range(shard_count), key=lambda x: (totals[x], x))
+        totals[shard_index] += costs.get(countryiso, default_cost)
+        shard_indices[countryiso] = shard_index
+    return shard_indices
+
+
+def get_shard(countries, shard_count, shard_index, method="hash", costs=None):
+    """Get the countries in shard shard_index of shard_count keeping the
+    order of countries. method is hash (stable hash of ISO3 code) or balanced
+    (balance the total of costs, a dictionary from ISO3 code to cost)."""
+    if shard_count < 2:
+        return countries
+    if not 0 <= shard_index < shard_count:
+        raise ValueError(f"Shard index {shard_index} not in 0 to {shard_count - 1}!")
+    if method == "hash":
+        shard_indices = {
+            x["iso3"]: get_hash_shard_index(x["iso3"], shard_count) for x in countries
+        }
+    elif method == "balanced":
+        shard_indices = get_balanced_shard_indices(countries, shard_count, costs or {})
+    else:
+        raise ValueError(f"Unknown sharding method {method}!")
+    shard = [x for x in countries if shard_indices[x["iso3"]] == shard_index]
+    logger.info(
+        f"Shard {shard_index} of {shard_count} ({method}) has {len(shard)} of {len(countries)} countries"
+    )
+    return shard
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+"""
+Staging:
+-------
+
+Stages generated datasets and showcases in an output folder so that they can
+be published to HDX in a later, separate step. Each staged dataset is written
+as a JSON file holding the dataset and showcase metadata, the paths of the
+resource files relative to the output folder and the QuickCharts settings.
+
+"""
+
+import logging
+from os.path import join, relpath
+from threading import Lock
+
+from hdx.data.resource import Resource
+from hdx.data.showcase import Showcase
+from hdx.utilities.loader import load_json
+from hdx.utilities.saver import save_json
+
+from hdx.scraper.worldbank.hdx_state import IndexedDataset
+
+logger = logging.getLogger(__name__)
+
+manifest_filename = "manifest.json"
+
+
+class Stager:
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = Lock()
+        self.entries = {}
+
+    def stage(
+        self,
+        key,
+        dataset,
+        showcase,
+        updated_by_script,
+        bites_disabled=None,
+        indicators=None,
+    ):
+        """Stage dataset and showcase. Entries are grouped by key (eg. country
+        ISO3) so that the manifest order does not depend on thread timing."""
+        name = dataset["name"]
+        files = {}
+        for resource in dataset.get_resources():
+            file_to_upload = resource.get_file_to_upload()
+            if file_to_upload:
+                files[resource["name"]] = relpath(file_to_upload, self.folder)
+        if showcase is None:
+            showcase_dict = None
+        else:
+            showcase_dict = showcase.data
+        entry = {
+            "dataset": dataset.get_dataset_dict(),
+            "showcase": showcase_dict,
+            "files": files,
+            "updated_by_script": updated_by_script,
+        }
+        if indicators is not None:
+            entry["quickcharts"] = {
+                "bites_disabled": bites_disabled,
+                "indicators": indicators,
+            }
+        filename = f"{name}.json"
+        save_json(entry, join(self.folder, filename))
+        with self.lock:
+            self.entries.setdefault(key, []).append(
+                {"name": name, "filename": filename}
+            )
+        return filename
+
+    def save_manifest(self, keys):
+        """Save manifest listing staged datasets grouped by key in the order
+        of keys. Publishing waits for each group's uploads before storing
+        progress."""
+        manifest = []
+        number = 0
+        for key in keys:
+            entries = self.entries.get(key)
+            if not entries:
+                continue
+            manifest.append({"key": key, "entries": entries})
+            number += len(entries)
+        save_json(manifest, join(self.folder, manifest_filename))
+        logger.info(f"Staged {number} datasets in {self.folder}")
+        return manifest
+
+
+def load_manifest(folder):
+    return load_json(join(folder, manifest_filename))
+
+
+def load_staged(folder, filename):
+    """Load staged dataset and showcase ready for publishing. Returns dataset,
+    showcase (or None), QuickCharts settings (or None) and updated by script
+    string."""
+    entry = load_json(join(folder, filename))
+    dataset_dict = entry["dataset"]
+    resources = dataset_dict.pop("resources", [])
+    dataset = IndexedDataset(dataset_dict)
+    files = entry["files"]
+    for resource_dict in resources:
+        resource = Resource(resource_dict)
+        file_to_upload = files.get(resource["name"])
+        if file_to_upload:
+            resource.set_file_to_upload(join(folder, file_to_upload))
+        dataset.add_update_resource(resource)
+    showcase_dict = entry["showcase"]
+    if showcase_dict is None:
+        showcase = None
+    else:
+        showcase = Showcase(showcase_dict)
+    return dataset, showcase, entry.get("quickcharts"), entry["updated_by_script"]
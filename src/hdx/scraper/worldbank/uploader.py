@@ -0,0 +1,136 @@
+#!/usr/bin/python
+"""
+Uploader:
+--------
+
+Runs HDX dataset and showcase uploads on a bounded thread pool.
+
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic, perf_counter, sleep
+
+from hdx.data.hdxobject import HDXError
+from tenacity import (
+    Retrying,
+    after_log,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_fixed,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Spaces calls evenly so that no more than calls_per_second are started
+    across all threads. A falsy calls_per_second disables limiting."""
+
+    def __init__(self, calls_per_second=None):
+        if calls_per_second:
+            self.interval = 1.0 / calls_per_second
+        else:
+            self.interval = 0
+        self.lock = Lock()
+        self.next_call = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            sleep(delay)
+
+
+class Uploader:
+    """Runs uploads on a bounded thread pool. Each upload is a sequence of
+    steps (eg. create dataset, create showcase, link showcase to dataset) that
+    run in order in one worker so dependent steps keep their ordering while
+    independent datasets upload concurrently. Every step is rate limited and
+    retried on HDXError, and the latency of each upload is recorded."""
+
+    def __init__(self, max_workers=4, calls_per_second=None, retries=5, retry_wait=60):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="upload"
+        )
+        self.rate_limiter = RateLimiter(calls_per_second)
+        self.retries = retries
+        self.retry_wait = retry_wait
+        self.lock = Lock()
+        self.futures = []
+        self.latencies = {}
+
+    @classmethod
+    def from_configuration(cls, configuration):
+        return cls(
+            max_workers=configuration.get("upload_workers", 4),
+            calls_per_second=configuration.get("upload_calls_per_second"),
+            retries=configuration.get("upload_retries", 5),
+            retry_wait=configuration.get("upload_retry_wait", 60),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def run_step(self, step):
+        for attempt in Retrying(
+            retry=retry_if_exception_type(HDXError),
+            stop=stop_after_attempt(self.retries),
+            wait=wait_fixed(self.retry_wait),
+            after=after_log(logger, logging.INFO),
+            reraise=True,
+        ):
+            with attempt:
+                self.rate_limiter.wait()
+                step()
+
+    def upload(self, name, steps):
+        start = perf_counter()
+        for step in steps:
+            self.run_step(step)
+        latency = perf_counter() - start
+        with self.lock:
+            self.latencies[name] = latency
+        logger.info(f"Uploaded {name} in {latency:.2f}s")
+        return latency
+
+    def submit(self, name, *steps):
+        future = self.executor.submit(self.upload, name, steps)
+        with self.lock:
+            self.futures.append(future)
+        return future
+
+    def wait(self):
+        """Wait for all submitted uploads to finish, raising the first error"""
+        with self.lock:
+            futures = self.futures
+            self.futures = []
+        error = None
+        for future in futures:
+            exception = future.exception()
+            if exception is not None and error is None:
+                error = exception
+        if error is not None:
+            raise error
+
+    def log_summary(self):
+        latencies = sorted(self.latencies.values())
+        number = len(latencies)
+        if number == 0:
+            return
+        mean = sum(latencies) / number
+        p95 = latencies[min(number - 1, int(number * 0.95))]
+        logger.info(
+            f"Uploaded {number} datasets: mean {mean:.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s"
+        )
@@ -0,0 +1,157 @@
+#!/usr/bin/python
+"""
+Warehouse:
+---------
+
+Local SQLite store of the observations fetched from the World Bank API,
+indexed by country, indicator and year, together with the catalog of topics
+and countries. Observations of a country and batch of indicators replace
+those stored before, so the store holds the latest fetch of each. In offline
+mode, datasets are generated from the store without requests to the World
+Bank API, for example after a change to metadata only.
+
+"""
+
+import json
+import logging
+import sqlite3
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+schema = """
+CREATE TABLE IF NOT EXISTS observations (
+    country_iso3 TEXT NOT NULL,
+    indicator_code TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    value,
+    PRIMARY KEY (country_iso3, indicator_code, year)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_indicator
+    ON observations (indicator_code, year);
+CREATE TABLE IF NOT EXISTS indicators (
+    code TEXT PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+# Keeps the number of parameters in a query well under SQLite's limit
+max_parameters = 500
+
+
+class Warehouse:
+    def __init__(self, path, offline=False):
+        self.path = path
+        self.offline = offline
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(schema)
+        self.lock = Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def save_catalog(self, name, value):
+        """Save JSON serialisable value such as the list of topics"""
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO catalog VALUES (?, ?)",
+                (name, json.dumps(value)),
+            )
+
+    def get_catalog(self, name):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM catalog WHERE name = ?", (name,)
+            ).fetchone()
+        if row is None:
+            raise ValueError(f"No {name} in warehouse {self.path}!")
+        return json.loads(row[0])
+
+    def save_observations(self, countryiso, indicator_codes, observations):
+        """Replace the observations of countryiso for indicator_codes with
+        observations as returned by the World Bank API"""
+        rows = []
+        indicators = {}
+        for observation in observations:
+            value = observation["value"]
+            if value is None:
+                continue
+            indicator = observation["indicator"]
+            indicators[indicator["id"]] = indicator["value"]
+            rows.append((countryiso, indicator["id"], int(observation["date"]), value))
+        with self.lock, self.connection:
+            for i in range(0, len(indicator_codes), max_parameters):
+                codes = indicator_codes[i : i + max_parameters]
+                self.connection.execute(
+                    "DELETE FROM observations WHERE country_iso3 = ? AND "
+                    f"indicator_code IN ({', '.join('?' * len(codes))})",
+                    (countryiso, *codes),
+                )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO indicators VALUES (?, ?)", indicators.items()
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?)", rows
+            )
+
+    def get_observations(self, countryiso, indicator_codes):
+        """Observations of countryiso for indicator_codes in the form returned
+        by the World Bank API, in the order of indicator_codes and latest year
+        first"""
+        positions = {code: i for i, code in enumerate(indicator_codes)}
+        rows = []
+        with self.lock:
+            for i in range(0, len(indicator_codes), max_parameters):
+                codes = indicator_codes[i : i + max_parameters]
+                rows.extend(
+                    self.connection.execute(
+                        "SELECT o.indicator_code, i.name, o.year, o.value "
+                        "FROM observations o JOIN indicators i ON o.indicator_code = i.code "
+                        f"WHERE o.country_iso3 = ? AND o.indicator_code IN ({', '.join('?' * len(codes))})",
+                        (countryiso, *codes),
+                    )
+                )
+        rows.sort(key=lambda x: (positions[x[0]], -x[2]))
+        return [
+            {
+                "indicator": {"id": code, "value": name},
+                "countryiso3code": countryiso,
+                "date": str(year),
+                "value": value,
+            }
+            for code, name, year, value in rows
+        ]
+
+    def get_latest_rows(self, countryisos, indicator_codes):
+        """Latest row of each of indicator_codes for countryisos in the form
+        collected for the topline dataset: a dictionary from country ISO3 code
+        to rows by indicator code"""
+        latest_rows = {}
+        with self.lock:
+            for code in indicator_codes:
+                for countryiso, name, year, value in self.connection.execute(
+                    "SELECT o.country_iso3, i.name, MAX(o.year), o.value "
+                    "FROM observations o JOIN indicators i ON o.indicator_code = i.code "
+                    "WHERE o.indicator_code = ? GROUP BY o.country_iso3",
+                    (code,),
+                ):
+                    if countryiso not in countryisos:
+                        continue
+                    latest_rows.setdefault(countryiso, {})[code] = {
+                        "Country ISO3": countryiso,
+                        "Year": year,
+                        "Indicator Name": name,
+                        "Indicator Code": code,
+                        "Value": value,
+                    }
+        return latest_rows
@@ -0,0 +1,158 @@
+#!/usr/bin/python
+"""
+Writer:
+------
+
+Writes the rows of a dataset to its csv and to the cut down csv that drives
+QuickCharts in a single pass. The output files and returned results are the
+same as those of Dataset.generate_resource_from_iterable with QuickCharts
+cutdown 2 which writes the two files separately.
+
+"""
+
+import csv
+import logging
+from errno import ENOSPC
+from os import makedirs, remove
+from os.path import exists, join
+
+from hdx.data.resource import Resource
+from hdx.utilities.downloader import Download
+
+logger = logging.getLogger(__name__)
+
+
+def get_header(hxltags, hashtag):
+    if not hashtag:
+        return None
+    return next(key for key, value in hxltags.items() if value == hashtag)
+
+
+def get_cutdown_headers(headers, hxltags, quickcharts, numeric):
+    cutdownhashtags = quickcharts.get("cutdownhashtags")
+    if cutdownhashtags is None:
+        cutdownhashtags = list(hxltags.keys())
+    else:
+        cutdownhashtags = [
+            key for key, value in hxltags.items() if value in cutdownhashtags
+        ]
+    if numeric and numeric not in cutdownhashtags:
+        cutdownhashtags.append(numeric)
+    return [x for x in headers if x in cutdownhashtags]
+
+
+def add_resource(dataset, filepath, resourcedata):
+    resource = Resource(resourcedata)
+    resource.set_format("csv")
+    resource.set_file_to_upload(filepath)
+    dataset.add_update_resource(resource)
+    return resource
+
+
+def generate_resources(
+    dataset,
+    headers,
+    rows,
+    hxltags,
+    folder,
+    filename,
+    resourcedata,
+    quickcharts,
+    disk_folder=None,
+):
+    """Write rows to a csv and a QuickCharts cut down csv (prefixed qc_) in
+    one pass and add resources for them to dataset. Returns True if resources
+    were added and a dictionary of results with the same keys as
+    Dataset.generate_resource_from_iterable. If disk_folder is given and the
+    memory backed filesystem of folder fills up, the files are written to
+    disk_folder instead."""
+    try:
+        return write_resources(
+            dataset, headers, rows, hxltags, folder, filename, resourcedata, quickcharts
+        )
+    except OSError as e:
+        if e.errno != ENOSPC or not disk_folder or disk_folder == folder:
+            raise
+    for path in (join(folder, filename), join(folder, f"qc_{filename}")):
+        if exists(path):
+            remove(path)
+    logger.warning(f"No space left for {filename} so writing it to {disk_folder}")
+    return write_resources(
+        dataset,
+        headers,
+        rows,
+        hxltags,
+        disk_folder,
+        filename,
+        resourcedata,
+        quickcharts,
+    )
+
+
+def write_resources(
+    dataset, headers, rows, hxltags, folder, filename, resourcedata, quickcharts
+):
+    column = get_header(hxltags, quickcharts.get("hashtag"))
+    numeric = get_header(hxltags, quickcharts.get("numeric_hashtag"))
+    values = quickcharts.get("values", [])
+    qcheaders = get_cutdown_headers(headers, hxltags, quickcharts, numeric)
+    allrows = [Download.hxl_row(headers, hxltags, dict_form=True)]
+    qcrows = [Download.hxl_row(qcheaders, hxltags, dict_form=True)]
+    bites_disabled = [True, True, True]
+
+    makedirs(folder, exist_ok=True)
+    filepath = join(folder, filename)
+    qc_filepath = join(folder, f"qc_{filename}")
+    with (
+        open(filepath, "w", encoding="utf-8", newline="") as file,
+        open(qc_filepath, "w", encoding="utf-8", newline="") as qc_file,
+    ):
+        writer = csv.writer(file, lineterminator="\r\n")
+        qc_writer = csv.writer(qc_file, lineterminator="\r\n")
+        writer.writerow(headers)
+        writer.writerow([allrows[0][x] for x in headers])
+        qc_writer.writerow(qcheaders)
+        qc_writer.writerow([qcrows[0][x] for x in qcheaders])
+
+        def add_qcrow(row):
+            qcrow = {x: row[x] for x in qcheaders}
+            qcrows.append(qcrow)
+            qc_writer.writerow([qcrow[x] for x in qcheaders])
+
+        for row in rows:
+            allrows.append(row)
+            writer.writerow([row.get(x) for x in headers])
+            if column is None:
+                add_qcrow(row)
+                continue
+            value = row[column]
+            for i, lookup in enumerate(values):
+                if value != lookup:
+                    continue
+                if numeric:
+                    try:
+                        float(row[numeric])
+                    except (TypeError, ValueError):
+                        continue
+                bites_disabled[i] = False
+                add_qcrow(row)
+
+    if len(allrows) == 1:
+        logger.error(f"No data rows in {filename}!")
+        remove(filepath)
+        remove(qc_filepath)
+        return False, {}
+    results = {
+        "resource": add_resource(dataset, filepath, resourcedata),
+        "headers": headers,
+        "rows": allrows,
+        "bites_disabled": bites_disabled,
+        "qcheaders": qcheaders,
+        "qcrows": qcrows,
+    }
+    qc_resourcedata = {
+        "name": f"QuickCharts-{resourcedata['name']}",
+        "description": "Cut down data for QuickCharts",
+    }
+    results["qc_resource"] = add_resource(dataset, qc_filepath, qc_resourcedata)
+    return True, results
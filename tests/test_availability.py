@@ -0,0 +1,168 @@
+#!/usr/bin/python
+"""
+Unit tests for availability.
+
+"""
+
+from datetime import datetime, timezone
+from os.path import join
+
+from hdx.utilities.compare import assert_files_same
+from hdx.utilities.path import temp_dir
+
+from tests.countries_data import CountriesData
+from tests.topics_data import TopicsData
+
+from hdx.scraper.worldbank.availability import AvailabilityIndex, DenyList
+from hdx.scraper.worldbank.pipeline import generate_dataset_and_showcase
+
+
+class TestAvailability:
+    indicators = [{"id": "A"}, {"id": "B"}, {"id": "C"}]
+
+    def test_filter_record(self):
+        with temp_dir("TestAvailability", delete_on_success=True) as folder:
+            path = join(folder, "availability.json")
+            today = datetime(2024, 3, 1, tzinfo=timezone.utc)
+            availability = AvailabilityIndex(path, 40, 10, today)
+            assert availability.filter("AFG", self.indicators) == self.indicators
+            availability.record("AFG", ["A", "B", "C"], {"B"})
+            assert availability.filter("AFG", self.indicators) == [{"id": "B"}]
+            assert availability.filter("BRA", self.indicators) == self.indicators
+            availability.record("AFG", ["A"], {"A"})
+            assert availability.filter("AFG", self.indicators) == [
+                {"id": "A"},
+                {"id": "B"},
+            ]
+            assert availability.skipped == 3
+            availability.save()
+
+            def get_availability(day):
+                today = datetime(2024, 3, day, tzinfo=timezone.utc)
+                return AvailabilityIndex(path, 40, 10, today)
+
+            availability = get_availability(8)
+            assert availability.entries == {"AFG": {"C": ["2024-03-01", "2024-03-01"]}}
+            assert availability.filter("AFG", self.indicators) == [
+                {"id": "A"},
+                {"id": "B"},
+            ]
+            availability = get_availability(11)
+            assert availability.filter("AFG", self.indicators) == self.indicators
+            availability = get_availability(21)
+            availability.record("AFG", ["C"], set())
+            availability.save()
+            assert availability.entries == {"AFG": {"C": ["2024-03-01", "2024-03-21"]}}
+            # Still empty after 20 days so not checked again for 15 to 20 days
+            availability = get_availability(31)
+            assert availability.filter("AFG", self.indicators) == [
+                {"id": "A"},
+                {"id": "B"},
+            ]
+            first = availability.today.replace(year=2020)
+            expiry_days = availability.get_expiry_days(
+                "AFG", "C", first, availability.today
+            )
+            assert 30 <= expiry_days <= 40
+
+    def test_generate_skips_empty(self, configuration, downloader):
+        urls = []
+
+        class CountingDownload:
+            def download(self, url):
+                urls.append(url)
+                return downloader.download(url)
+
+        availability = AvailabilityIndex()
+        with temp_dir("TestAvailability", delete_on_success=True) as folder:
+            for _ in range(2):
+                dataset, _, _, _, _ = generate_dataset_and_showcase(
+                    configuration,
+                    CountingDownload(),
+                    folder,
+                    CountriesData.country,
+                    TopicsData.topics[1],
+                    availability,
+                )
+                assert dataset is None
+        assert len(urls) == 1
+        assert list(availability.entries["AFG"]) == ["SI.POV.GAPS"]
+
+    def test_bisect_failing_batch(self, configuration, downloader):
+        urls = []
+        topic = dict(TopicsData.topics[0])
+        indicators = topic["sources"]["2"]
+        topic["sources"] = {"2": indicators[:2] + [{"id": "BAD"}] + indicators[2:]}
+
+        class FailingDownload:
+            def download(self, url):
+                urls.append(url)
+                if "BAD" in url:
+
+                    class Response:
+                        @staticmethod
+                        def json():
+                            return [{"message": [{"key": "Invalid value"}]}]
+
+                    return Response()
+                return downloader.download(url)
+
+        denylist = DenyList()
+        with temp_dir("TestAvailability", delete_on_success=True) as folder:
+            dataset, _, _, _, _ = generate_dataset_and_showcase(
+                configuration,
+                FailingDownload(),
+                folder,
+                CountriesData.country,
+                topic,
+                denylist=denylist,
+            )
+            assert dataset["name"] == (
+                "world-bank-gender-and-science-indicators-for-afghanistan"
+            )
+            assert len(urls) == 5
+            filename = "gender-and-science_AFG.csv"
+            assert_files_same(
+                join("tests", "fixtures", f"split_{filename}"), join(folder, filename)
+            )
+            today = denylist.today.isoformat()
+            assert denylist.entries == {"AFG": {"BAD": [today, today]}}
+            assert denylist.filter("AFG", topic["sources"]["2"]) == indicators
+
+    def test_generic_error(self, configuration):
+        urls = []
+
+        class FailingDownload:
+            def download(self, url):
+                urls.append(url)
+
+                class Response:
+                    @staticmethod
+                    def json():
+                        return [
+                            {
+                                "message": [
+                                    {
+                                        "id": "105",
+                                        "key": "Service currently unavailable",
+                                    }
+                                ]
+                            }
+                        ]
+
+                return Response()
+
+        denylist = DenyList()
+        with temp_dir("TestAvailability", delete_on_success=True) as folder:
+            dataset, _, _, _, _ = generate_dataset_and_showcase(
+                configuration,
+                FailingDownload(),
+                folder,
+                CountriesData.country,
+                TopicsData.topics[0],
+                denylist=denylist,
+            )
+        assert dataset is None
+        # The batch is neither bisected nor deny listed
+        assert len(urls) == 1
+        assert denylist.entries == {}
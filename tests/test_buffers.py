@@ -0,0 +1,92 @@
+#!/usr/bin/python
+"""
+Unit tests for buffers.
+
+"""
+
+from os import makedirs
+from os.path import exists, join
+
+from hdx.data.dataset import Dataset
+from hdx.data.resource import Resource
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank.buffers import ResourceBuffers
+
+
+class TestBuffers:
+    @staticmethod
+    def add_resource(dataset, folder, name, size):
+        path = join(folder, name)
+        with open(path, "w") as file:
+            file.write("x" * size)
+        resource = Resource({"name": name})
+        resource.set_format("csv")
+        resource.set_file_to_upload(path)
+        dataset.add_update_resource(resource)
+        return path
+
+    def test_place_release(self, configuration):
+        with temp_dir("TestBuffers", delete_on_success=True) as tempdir:
+            disk_folder = join(tempdir, "disk")
+            memory_folder = join(tempdir, "memory")
+            makedirs(memory_folder)
+            buffers = ResourceBuffers(disk_folder, memory_folder, 100, 150)
+            folder = buffers.get_folder("AFG")
+            assert folder == join(memory_folder, "AFG")
+            dataset = Dataset({"name": "test"})
+            small = self.add_resource(dataset, folder, "small.csv", 80)
+            large = self.add_resource(dataset, folder, "large.csv", 120)
+            buffers.place(dataset)
+            resources = dataset.get_resources()
+            assert resources[0].get_file_to_upload() == small
+            disk_large = join(disk_folder, "AFG", "large.csv")
+            assert resources[1].get_file_to_upload() == disk_large
+            assert not exists(large)
+            assert exists(disk_large)
+            assert buffers.total_size == 80
+            assert buffers.spilled == 1
+
+            # Would take total over maximum so goes to disk
+            dataset2 = Dataset({"name": "test2"})
+            other = self.add_resource(dataset2, folder, "other.csv", 80)
+            buffers.place(dataset2)
+            disk_other = join(disk_folder, "AFG", "other.csv")
+            assert dataset2.get_resources()[0].get_file_to_upload() == disk_other
+            assert not exists(other)
+            assert buffers.spilled == 2
+
+            buffers.release(dataset)
+            assert not exists(small)
+            assert exists(disk_large)
+            assert buffers.total_size == 0
+            buffers.close()
+            assert not exists(memory_folder)
+
+    def test_get_folder(self):
+        with temp_dir("TestBuffers", delete_on_success=True) as tempdir:
+            disk_folder = join(tempdir, "disk")
+            memory_folder = join(tempdir, "memory")
+            makedirs(memory_folder)
+            buffers = ResourceBuffers(disk_folder, memory_folder, 100, 150)
+            assert buffers.get_folder("AFG") == join(memory_folder, "AFG")
+            # No room for another file of maximum size so decided before
+            # writing that the files go to disk
+            buffers.total_size = 60
+            assert buffers.get_folder("BRA") == join(disk_folder, "BRA")
+            buffers.close()
+
+    def test_from_configuration(self):
+        buffers = ResourceBuffers.from_configuration(
+            {"keep_resource_files": True}, "disk", "test"
+        )
+        assert buffers.memory_folder is None
+        assert buffers.is_in_memory("disk/AFG/a.csv") is False
+        with temp_dir("TestBuffers", delete_on_success=True) as tempdir:
+            buffers = ResourceBuffers.from_configuration(
+                {"memory_folder": tempdir}, "disk", "test"
+            )
+            assert buffers.memory_folder == join(tempdir, "test")
+            assert buffers.is_in_memory(join(tempdir, "test", "AFG", "a.csv"))
+            assert not buffers.is_in_memory(join(tempdir, "test2", "a.csv"))
+            buffers.close()
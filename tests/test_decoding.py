@@ -0,0 +1,27 @@
+#!/usr/bin/python
+"""
+Unit tests for decoding.
+
+"""
+
+import json
+
+import pytest
+
+from hdx.scraper.worldbank.decoding import get_loads
+
+
+class TestDecoding:
+    payload = b'[{"page": 1, "total": 1}, [{"date": "2020", "value": 1.5e-05}]]'
+
+    def test_get_loads(self):
+        expected = json.loads(self.payload)
+        assert get_loads("json") is json.loads
+        assert get_loads()(self.payload) == expected
+        assert get_loads("orjson")(self.payload) == expected
+        with pytest.raises(ValueError):
+            get_loads("lala")
+
+    def test_orjson(self):
+        orjson = pytest.importorskip("orjson")
+        assert get_loads() is orjson.loads
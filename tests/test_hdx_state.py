@@ -0,0 +1,92 @@
+#!/usr/bin/python
+"""
+Unit tests for hdx state.
+
+"""
+
+import pytest
+from hdx.data.dataset import Dataset
+from hdx.data.showcase import Showcase
+
+from hdx.scraper.worldbank.hdx_state import HDXState, IndexedDataset
+
+
+class TestHDXState:
+    existing_dataset = {
+        "id": "6f7b7a9e-5a8c-4b8e-9c3a-0d1e2f3a4b5c",
+        "name": "world-bank-health-indicators-for-afghanistan",
+        "title": "Afghanistan - Health",
+        "resources": [{"id": "abc", "name": "Health Indicators for Afghanistan"}],
+    }
+    existing_showcase = {
+        "id": "1a2b3c4d-5a8c-4b8e-9c3a-0d1e2f3a4b5c",
+        "name": "world-bank-health-indicators-for-afghanistan-showcase",
+        "title": "Health indicators for Afghanistan",
+        "notes": "Health indicators for Afghanistan",
+        "url": "https://data.worldbank.org/topic/health?locations=AF",
+        "image_url": "https://www.worldbank.org/content/dam/wbr/logo/logo-wb-header-en.svg",
+        "tags": [{"name": "health"}, {"name": "hxl"}],
+    }
+
+    def test_load_dataset(self, configuration):
+        hdx_state = HDXState([self.existing_dataset], [])
+        assert hdx_state.get_dataset(self.existing_dataset["id"])["title"] == (
+            "Afghanistan - Health"
+        )
+        dataset = IndexedDataset(
+            {"name": self.existing_dataset["name"], "title": "Afghanistan - Health!"}
+        )
+        hdx_state.attach_dataset(dataset)
+        assert dataset._dataset_load_from_hdx(dataset["name"]) is True
+        assert dataset.old_data["title"] == "Afghanistan - Health!"
+        assert dataset["id"] == self.existing_dataset["id"]
+        assert dataset.get_resources()[0]["id"] == "abc"
+
+        dataset = IndexedDataset({"name": "world-bank-new", "title": "New"})
+        hdx_state.attach_dataset(dataset)
+        assert dataset._dataset_load_from_hdx(dataset["name"]) is False
+        assert hdx_state.first_miss(dataset["name"]) is False
+
+        with pytest.raises(TypeError):
+            hdx_state.attach_dataset(Dataset({"name": "world-bank-new"}))
+
+    def test_create_in_hdx_uses_index(self, monkeypatch, configuration):
+        # IndexedDataset relies on create_in_hdx looking up the existing
+        # dataset with _dataset_load_from_hdx and updating it if found
+        hdx_state = HDXState([self.existing_dataset], [])
+        dataset = IndexedDataset(
+            {"name": self.existing_dataset["name"], "title": "Afghanistan - Health!"}
+        )
+        hdx_state.attach_dataset(dataset)
+        updates = []
+        monkeypatch.setattr(
+            dataset, "_dataset_hdx_update", lambda **kwargs: updates.append(kwargs)
+        )
+        monkeypatch.setattr(
+            Dataset,
+            "_load_from_hdx",
+            lambda *args: pytest.fail("Dataset read from HDX"),
+        )
+        dataset.create_in_hdx(ignore_check=True, hxl_update=False)
+        assert len(updates) == 1
+        assert dataset["id"] == self.existing_dataset["id"]
+        assert dataset.old_data["title"] == "Afghanistan - Health!"
+
+    def test_is_showcase_unchanged(self, configuration):
+        hdx_state = HDXState([], [self.existing_showcase])
+        data = {
+            key: value
+            for key, value in self.existing_showcase.items()
+            if key not in ("id", "tags")
+        }
+        showcase = Showcase(data)
+        showcase.add_tags(["hxl", "health"])
+        assert hdx_state.is_showcase_unchanged(showcase) is True
+        assert hdx_state.create_showcase(showcase) is None
+        assert showcase["id"] == self.existing_showcase["id"]
+
+        showcase = Showcase(data)
+        showcase.add_tags(["hxl", "gender"])
+        assert hdx_state.is_showcase_unchanged(showcase) is False
+        showcase = Showcase({"name": "world-bank-new-showcase"})
+        assert hdx_state.is_showcase_unchanged(showcase) is False
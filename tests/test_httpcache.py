@@ -0,0 +1,89 @@
+#!/usr/bin/python
+"""
+Unit tests for HTTP cache.
+
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os.path import join
+from threading import Thread
+
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank.httpcache import ValidatorCache
+from hdx.scraper.worldbank.session import PooledDownload
+
+
+class Handler(BaseHTTPRequestHandler):
+    body = b'[{"page": 1}, [{"id": "AFG"}]]'
+    requests = []
+
+    def do_GET(self):
+        if_none_match = self.headers.get("If-None-Match")
+        self.requests.append((self.path, if_none_match))
+        if self.path == "/changing":
+            etag = f'"{len(self.requests)}"'
+        else:
+            etag = '"1"'
+        if if_none_match == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestHTTPCache:
+    def test_validator_cache(self):
+        with temp_dir("TestHTTPCache", delete_on_success=True) as folder:
+            cache = ValidatorCache(folder)
+            url = "http://lala/v2/en/country?format=json"
+            assert cache.get_headers(url) is None
+            cache.save(url, {}, b"[]")
+            assert cache.get_headers(url) is None
+            cache.save(
+                url,
+                {"ETag": '"abc"', "Last-Modified": "Tue, 28 Jan 2025 00:00:00 GMT"},
+                b"[1]",
+            )
+            assert cache.get_headers(url) == {
+                "If-None-Match": '"abc"',
+                "If-Modified-Since": "Tue, 28 Jan 2025 00:00:00 GMT",
+            }
+            assert cache.get_content(url) == b"[1]"
+            assert cache.not_modified == 1
+            assert cache.modified == 2
+
+    def test_conditional_download(self, configuration):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            with temp_dir("TestHTTPCache", delete_on_success=True) as folder:
+                cache_folder = join(folder, "http_cache")
+                for _ in range(2):
+                    with PooledDownload.from_configuration(
+                        {"http_retry_attempts": 1}, cache_folder
+                    ) as downloader:
+                        for path in ("/stable", "/changing"):
+                            response = downloader.download(f"{base_url}{path}")
+                            assert response.json() == [{"page": 1}, [{"id": "AFG"}]]
+                assert Handler.requests == [
+                    ("/stable", None),
+                    ("/changing", None),
+                    ("/stable", '"1"'),
+                    ("/changing", '"2"'),
+                ]
+                assert downloader.cache.not_modified == 1
+                assert downloader.cache.modified == 1
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+"""
+Unit tests for main.
+
+"""
+
+from concurrent.futures import Future
+from os.path import exists, join
+
+import pytest
+from hdx.utilities.downloader import DownloadError
+from hdx.utilities.path import temp_dir
+from hdx.utilities.saver import save_json
+from tenacity import RetryError, retry, retry_if_exception_type, stop_after_attempt
+
+from tests.countries_data import CountriesData
+from tests.topics_data import TopicsData
+
+import hdx.scraper.worldbank.__main__ as main_module
+from hdx.scraper.worldbank.__main__ import get_shard_countries, get_state_folder
+
+
+class Uploader:
+    @classmethod
+    def from_configuration(cls, configuration):
+        return cls()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def submit(self, name, *steps):
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def wait(self):
+        pass
+
+    def log_summary(self):
+        pass
+
+
+def patch_main(monkeypatch, configuration, downloader):
+    """Run main and generate_and_stage with downloader and without HDX"""
+
+    class Download:
+        @classmethod
+        def from_configuration(cls, configuration, cache_folder=None, threads=1):
+            return cls()
+
+        def __enter__(self):
+            return downloader
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            pass
+
+    monkeypatch.setattr(main_module, "PooledDownload", Download)
+    monkeypatch.setattr(main_module, "Uploader", Uploader)
+    monkeypatch.setattr(
+        main_module.Configuration, "read", staticmethod(lambda: configuration)
+    )
+    monkeypatch.setattr(
+        main_module.User,
+        "check_current_user_write_access",
+        staticmethod(lambda organisation: None),
+    )
+
+    def get_topics(base_url, downloader, lastupdated=None):
+        if lastupdated is not None:
+            lastupdated["2"] = "2019-09-27"
+        return TopicsData.topics[:4]
+
+    monkeypatch.setattr(main_module, "get_topics", get_topics)
+    monkeypatch.setattr(
+        main_module,
+        "get_countries",
+        lambda base_url, downloader: [CountriesData.country],
+    )
+    monkeypatch.setitem(configuration, "prefetch_hdx_state", False)
+
+
+class TestMain:
+    countries = [{"iso3": iso3} for iso3 in ("AFG", "BRA", "CHN", "USA")]
+
+    def test_get_shard_countries(self, monkeypatch):
+        for key in ("SHARD_COUNT", "SHARD_INDEX", "SHARD_METHOD", "SHARD_COSTS_FILE"):
+            monkeypatch.delenv(key, raising=False)
+        configuration = {"shard_method": "balanced"}
+        assert get_shard_countries(configuration, self.countries) == self.countries
+        configuration["shard_count"] = 2
+        with pytest.raises(ValueError):
+            get_shard_countries(configuration, self.countries)
+        with temp_dir("TestMain", delete_on_success=True) as folder:
+            path = join(folder, "costs.json")
+            save_json({"USA": 10, "CHN": 9, "BRA": 3, "AFG": 1}, path)
+            configuration["shard_costs_file"] = path
+            shards = [
+                get_shard_countries(configuration | {"shard_index": i}, self.countries)
+                for i in range(2)
+            ]
+        assert [[x["iso3"] for x in shard] for shard in shards] == [
+            ["AFG", "USA"],
+            ["BRA", "CHN"],
+        ]
+        configuration = {"shard_count": 2, "shard_index": 1}
+        assert [
+            x["iso3"] for x in get_shard_countries(configuration, self.countries)
+        ] == ["AFG", "CHN"]
+
+    def test_get_state_folder(self, monkeypatch):
+        for key in ("SHARD_COUNT", "SHARD_INDEX"):
+            monkeypatch.delenv(key, raising=False)
+        with temp_dir("TestMain", delete_on_success=True) as folder:
+            monkeypatch.setenv("STATE_FOLDER", folder)
+            assert get_state_folder({}) == folder
+            # Shards keep their state apart except what is shared
+            configuration = {"shard_count": 3, "shard_index": 1}
+            assert get_state_folder(configuration) == join(folder, "shard-1-of-3")
+            assert exists(join(folder, "shard-1-of-3"))
+            assert get_state_folder(configuration, True) == folder
+
+    def test_main_parquet(self, monkeypatch, configuration, downloader):
+        pytest.importorskip("pyarrow")
+        patch_main(monkeypatch, configuration, downloader)
+        monkeypatch.setitem(configuration, "parquet_export", True)
+        with temp_dir("TestMain", delete_on_success=True) as folder:
+            parquet_folder = join(folder, "parquet")
+            monkeypatch.setenv("PARQUET_FOLDER", parquet_folder)
+            monkeypatch.setenv("STATE_FOLDER", join(folder, "state"))
+            monkeypatch.setenv("OUTPUT_FOLDER", join(folder, "staged"))
+            main_module.main()
+            # The run folder is deleted on success but the export is kept
+            assert exists(join(parquet_folder, "AFG", "indicators_AFG.parquet"))
+            assert exists(
+                join(parquet_folder, "indicators", "Country ISO3=AFG", "part-0.parquet")
+            )
+
+    def test_generate_and_stage_errors(self, monkeypatch, configuration, downloader):
+        failures = []
+
+        class FailingDownload:
+            def __init__(self, failing):
+                self.failing = failing
+
+            def download(self, url, **kwargs):
+                if "/indicator/" in url and self.failing:
+                    self.failing -= 1
+                    failures.append(url)
+                    raise DownloadError(f"Failed {url}")
+                return downloader.download(url, **kwargs)
+
+        monkeypatch.setattr(
+            main_module,
+            "retry_on_error",
+            retry(
+                retry=retry_if_exception_type(DownloadError), stop=stop_after_attempt(2)
+            ),
+        )
+        monkeypatch.setenv("SELECTIVE_REFRESH", "true")
+        with temp_dir("TestMain", delete_on_success=True) as folder:
+            state_folder = join(folder, "state")
+            monkeypatch.setenv("STATE_FOLDER", state_folder)
+            output_folder = join(folder, "staged")
+            # A transient error is retried for the country
+            patch_main(monkeypatch, configuration, FailingDownload(1))
+            main_module.generate_and_stage(configuration, output_folder)
+            assert len(failures) == 1
+            assert exists(join(output_folder, "AFG"))
+            assert exists(join(state_folder, "source_updates.json"))
+
+            # State learned before a country fails for good is still saved
+            # but source updates are not so the country is refreshed next time
+            failures.clear()
+            state_folder = join(folder, "state2")
+            monkeypatch.setenv("STATE_FOLDER", state_folder)
+            patch_main(monkeypatch, configuration, FailingDownload(2))
+            with pytest.raises(RetryError):
+                main_module.generate_and_stage(configuration, output_folder)
+            assert len(failures) == 2
+            assert exists(join(state_folder, "country_costs.json"))
+            assert exists(join(state_folder, "denylist.json"))
+            assert not exists(join(state_folder, "source_updates.json"))
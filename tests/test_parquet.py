@@ -0,0 +1,70 @@
+#!/usr/bin/python
+"""
+Unit tests for parquet.
+
+"""
+
+from os.path import exists, join
+
+import pytest
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank.parquet import ParquetExport
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+class TestParquet:
+    rows = [
+        {
+            "Country Name": "Afghanistan",
+            "Country ISO3": "AFG",
+            "Year": 2020,
+            "Indicator Name": "Population, total",
+            "Indicator Code": "SP.POP.TOTL",
+            "Value": 38972230,
+        },
+        {
+            "Country Name": "Afghanistan",
+            "Country ISO3": "AFG",
+            "Year": 2019,
+            "Indicator Name": "Population, total",
+            "Indicator Code": "SP.POP.TOTL",
+            "Value": 37769499,
+        },
+        {
+            "Country Name": "Afghanistan",
+            "Country ISO3": "AFG",
+            "Year": 2020,
+            "Indicator Name": "Life expectancy at birth, total (years)",
+            "Indicator Code": "SP.DYN.LE00.IN",
+            "Value": 62.575,
+        },
+    ]
+
+    def test_from_configuration(self):
+        assert ParquetExport.from_configuration({}, "folder") is None
+        parquet = ParquetExport.from_configuration(
+            {"parquet_export": True, "parquet_all_countries": False}, "folder"
+        )
+        assert parquet.folder == "folder"
+        assert parquet.all_countries is False
+
+    def test_write(self):
+        with temp_dir("TestParquet", delete_on_success=True) as folder:
+            parquet = ParquetExport(folder)
+            parquet.write("AFG", self.rows)
+            table = pq.read_table(join(folder, "AFG", "indicators_AFG.parquet"))
+            assert table.schema == parquet.schema
+            assert table.column("Year").to_pylist() == [2020, 2019, 2020]
+            assert table.column("Value").to_pylist() == [38972230.0, 37769499.0, 62.575]
+            codes = table.column("Indicator Code").combine_chunks()
+            assert codes.dictionary.to_pylist() == ["SP.POP.TOTL", "SP.DYN.LE00.IN"]
+            table = pq.read_table(join(folder, "indicators"))
+            assert table.num_rows == 3
+            assert table.column("Country ISO3").to_pylist() == ["AFG", "AFG", "AFG"]
+
+            parquet = ParquetExport(folder, all_countries=False)
+            parquet.write("BRA", self.rows)
+            assert exists(join(folder, "BRA", "indicators_BRA.parquet"))
+            assert not exists(join(folder, "indicators", "Country ISO3=BRA"))
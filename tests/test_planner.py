@@ -0,0 +1,68 @@
+#!/usr/bin/python
+"""
+Unit tests for planner.
+
+"""
+
+from os.path import join
+from time import tzset
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank.planner import RunPlanner, get_deadline
+
+
+class TestPlanner:
+    countries = [{"iso3": "AFG"}, {"iso3": "BRA"}, {"iso3": "CHN"}]
+    costs = {"AFG": 10, "BRA": 20, "CHN": 30}
+
+    def test_get_deadline(self):
+        assert get_deadline("") is None
+        assert get_deadline("60", 1000) == 4600
+        assert get_deadline(30, 1000) == 2800
+        assert get_deadline("2026-11-01T06:00:00") == 1793512800
+        assert get_deadline("2026-11-01T08:00:00+02:00") == 1793512800
+
+    def test_get_deadline_local_timezone(self, monkeypatch):
+        # A deadline without timezone is UTC whatever the host's timezone
+        monkeypatch.setenv("TZ", "America/New_York")
+        tzset()
+        try:
+            assert get_deadline("2026-11-01T06:00:00") == 1793512800
+        finally:
+            monkeypatch.undo()
+            tzset()
+
+    def test_plan(self):
+        planner = RunPlanner(100, self.costs)
+        assert planner.plan("AFG", ["AFG", "BRA", "CHN"], 0) is False
+        # AFG took twice as long as predicted
+        planner.record("AFG", 20, False)
+        assert planner.get_throughput_ratio() == 2
+        assert planner.estimate(["BRA", "CHN"]) == 100
+        assert planner.plan("BRA", ["BRA", "CHN"], 20) is True
+        planner.record("BRA", 5, True)
+        assert planner.plan("CHN", ["CHN"], 25) is False
+        planner.record("CHN", 30, False)
+        assert planner.deferred == {"BRA"}
+
+    def test_order_and_save(self):
+        with temp_dir("TestPlanner", delete_on_success=True) as folder:
+            path = join(folder, "deferred.json")
+            planner = RunPlanner(100, self.costs, path)
+            planner.record("CHN", 1, True)
+            planner.record("AFG", 1, True)
+            planner.save()
+            assert load_json(path) == ["AFG", "CHN"]
+
+            planner = RunPlanner(100, self.costs, path)
+            order = planner.order(self.countries, folder)
+            assert [x["iso3"] for x in order] == ["AFG", "CHN", "BRA"]
+            # A resumed run uses the saved order
+            planner.record("AFG", 10, False)
+            planner.save()
+            planner = RunPlanner(100, self.costs, path)
+            order = planner.order(self.countries, folder)
+            assert [x["iso3"] for x in order] == ["AFG", "CHN", "BRA"]
+            assert planner.deferred == {"CHN"}
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+"""
+Unit tests for profiling.
+
+"""
+
+import pstats
+from os.path import exists, join
+
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank.profiling import Profiler
+
+
+def country_work():
+    return sum(range(1000))
+
+
+def topic_work():
+    return sorted(range(1000), reverse=True)
+
+
+class TestProfiling:
+    @staticmethod
+    def get_functions(path):
+        return {x[2] for x in pstats.Stats(path).stats}
+
+    def test_profile(self):
+        with temp_dir("TestProfiling", delete_on_success=True) as folder:
+            profiler = Profiler(folder, topics=True)
+            with profiler.profile("AFG"):
+                country_work()
+                with profiler.profile_topic("AFG", "Gender and Science"):
+                    topic_work()
+            topic_path = join(folder, "AFG_gender-and-science.prof")
+            functions = self.get_functions(topic_path)
+            assert "topic_work" in functions
+            assert "country_work" not in functions
+            functions = self.get_functions(join(folder, "AFG.prof"))
+            assert "topic_work" in functions
+            assert "country_work" in functions
+            assert profiler.paths == [join(folder, "AFG.prof")]
+
+            # A retried country replaces its profile rather than adding to it
+            with profiler.profile("AFG"):
+                country_work()
+            assert profiler.paths == [join(folder, "AFG.prof")]
+            assert "topic_work" not in self.get_functions(join(folder, "AFG.prof"))
+
+            profiler.topics = False
+            with profiler.profile("BRA"):
+                with profiler.profile_topic("BRA", "Health"):
+                    topic_work()
+            assert not exists(join(folder, "BRA_health.prof"))
+            profiler.log_summary()
+            functions = self.get_functions(join(folder, "summary.prof"))
+            assert "topic_work" in functions
+            assert "country_work" in functions
+
+    def test_from_configuration(self):
+        assert Profiler.from_configuration({}, "TestProfiling") is None
+        with temp_dir("TestProfiling", delete_on_success=True) as folder:
+            profiler = Profiler.from_configuration(
+                {"profile": True, "profile_folder": folder, "profile_topics": True},
+                "TestProfiling",
+            )
+            assert profiler.folder == folder
+            assert profiler.topics is True
+            assert profiler.summary_count == 30
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+"""
+Unit tests for refresh.
+
+"""
+
+from copy import deepcopy
+from os.path import exists, join
+
+from hdx.utilities.compare import assert_files_same
+from hdx.utilities.path import temp_dir
+
+from tests.countries_data import CountriesData
+from tests.topics_data import TopicsData
+
+from hdx.scraper.worldbank.pipeline import generate_all_datasets_showcases
+from hdx.scraper.worldbank.refresh import SourceUpdates, is_topic_updated
+from hdx.scraper.worldbank.warehouse import Warehouse
+
+
+class TestRefresh:
+    def test_source_updates(self):
+        with temp_dir("TestRefresh", delete_on_success=True) as folder:
+            path = join(folder, "source_updates.json")
+            source_updates = SourceUpdates(path)
+            source_updates.lastupdated = {"2": "2019-09-27"}
+            assert source_updates.get_updated_sources() is None
+            source_updates.save(True)
+
+            source_updates = SourceUpdates(path)
+            assert source_updates.previous_warehouse is True
+            assert source_updates.get_updated_sources() is None
+            source_updates.lastupdated = {"2": "2019-09-27", "3": "2020-01-01"}
+            assert source_updates.get_updated_sources() == {"3"}
+            source_updates.lastupdated = {"2": "2020-01-01"}
+            assert source_updates.get_updated_sources() == {"2"}
+
+    def test_is_topic_updated(self):
+        topic = {"sources": {"2": [], "3": []}}
+        assert is_topic_updated(topic, None) is True
+        assert is_topic_updated(topic, {"3"}) is True
+        assert is_topic_updated(topic, {"57"}) is False
+        assert is_topic_updated({"sources": {}}, {"2"}) is False
+
+    def test_generate_updated_topics(self, configuration, downloader):
+        created = []
+
+        def create_dataset_showcase(dataset, showcase, qc_indicators, batch):
+            created.append(dataset["name"])
+
+        country = CountriesData.country
+        topics = TopicsData.topics[:4]
+        with temp_dir("TestRefresh", delete_on_success=True) as folder:
+            with Warehouse(join(folder, "warehouse.sqlite")) as warehouse:
+                generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    folder,
+                    country,
+                    topics,
+                    create_dataset_showcase,
+                    "1234",
+                    warehouse=warehouse,
+                )
+                assert created == [
+                    "world-bank-gender-and-science-indicators-for-afghanistan",
+                    "world-bank-health-indicators-for-afghanistan",
+                ]
+
+                created.clear()
+                dataset, _, _ = generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    folder,
+                    country,
+                    topics,
+                    create_dataset_showcase,
+                    "1234",
+                    warehouse=warehouse,
+                    updated_sources={"57"},
+                )
+                assert dataset is None
+                assert created == []
+
+                # Health is from a source that has not been updated so its
+                # rows for the combined dataset come from the warehouse
+                topics = deepcopy(topics)
+                topics[2]["sources"] = {"57": topics[2]["sources"]["2"]}
+                updated_folder = join(folder, "updated")
+                dataset, _, _ = generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    updated_folder,
+                    country,
+                    topics,
+                    create_dataset_showcase,
+                    "1234",
+                    warehouse=warehouse,
+                    updated_sources={"2"},
+                )
+            assert created == [
+                "world-bank-gender-and-science-indicators-for-afghanistan"
+            ]
+            # Resource files of topics that are not created are deleted
+            assert not exists(join(updated_folder, f"health_{country['iso3']}.csv"))
+            assert exists(
+                join(updated_folder, f"gender-and-science_{country['iso3']}.csv")
+            )
+            assert dataset["name"] == "world-bank-combined-indicators-for-afghanistan"
+            filename = f"indicators_{country['iso3']}.csv"
+            assert_files_same(
+                join("tests", "fixtures", filename), join(updated_folder, filename)
+            )
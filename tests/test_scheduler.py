@@ -0,0 +1,49 @@
+#!/usr/bin/python
+"""
+Unit tests for scheduler.
+
+"""
+
+from os.path import join
+
+from hdx.utilities.loader import load_json
+from hdx.utilities.path import temp_dir
+from hdx.utilities.saver import save_json
+
+from hdx.scraper.worldbank.scheduler import CountryScheduler
+
+
+class TestScheduler:
+    countries = [{"iso3": iso3} for iso3 in ("AFG", "BRA", "CHN", "DZA")]
+
+    def test_order_predict(self):
+        scheduler = CountryScheduler()
+        assert scheduler.order(self.countries) == self.countries
+        assert scheduler.predict(self.countries, 2) == 2
+        scheduler.costs = {"AFG": 1, "BRA": 5, "CHN": 3}
+        ordered = scheduler.order(self.countries)
+        assert [x["iso3"] for x in ordered] == ["BRA", "CHN", "DZA", "AFG"]
+        assert scheduler.predict(ordered, 2) == 6
+        assert scheduler.predict(self.countries, 2) == 7
+        assert scheduler.predict(ordered) == 12
+
+    def test_timed_save(self):
+        with temp_dir("TestScheduler", delete_on_success=True) as folder:
+            path = join(folder, "country_costs.json")
+            save_json({"AFG": 10, "BRA": 2}, path)
+            scheduler = CountryScheduler(path)
+            assert scheduler.costs == {"AFG": 10, "BRA": 2}
+            with scheduler.timed("BRA"):
+                pass
+            try:
+                with scheduler.timed("CHN"):
+                    raise ValueError
+            except ValueError:
+                pass
+            assert list(scheduler.timings) == ["BRA"]
+            scheduler.report(6, 5)
+            scheduler.save()
+            costs = load_json(path)
+            assert sorted(costs) == ["AFG", "BRA"]
+            assert costs["AFG"] == 10
+            assert costs["BRA"] < 2
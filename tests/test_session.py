@@ -0,0 +1,52 @@
+#!/usr/bin/python
+"""
+Unit tests for session.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+
+from hdx.utilities.path import temp_dir
+from hdx.utilities.saver import save_json
+
+from hdx.scraper.worldbank.session import PooledDownload
+
+
+class TestSession:
+    def test_pooled_download(self, configuration):
+        with temp_dir("worldbank-session") as folder:
+            path = join(folder, "test.json")
+            save_json([{"page": 1}, [{"id": "AFG"}]], path)
+            with PooledDownload.from_configuration(
+                {"http_pool_maxsize": 4}
+            ) as downloader:
+                session = downloader.session
+                assert session.headers["Accept-Encoding"] == "gzip, deflate"
+                adapter = session.get_adapter("https://api.worldbank.org/")
+                assert adapter._pool_maxsize == 4
+                assert adapter._pool_block is True
+
+                def fetch(_):
+                    response = downloader.download(path)
+                    return response.json()[1][0]["id"], downloader.get_downloader()
+
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    results = list(executor.map(fetch, range(6)))
+                assert {x[0] for x in results} == {"AFG"}
+                for _, thread_downloader in results:
+                    assert thread_downloader.session is session
+                assert 1 <= len(downloader.downloaders) <= 3
+            # The pool has a connection for each thread making requests
+            with PooledDownload.from_configuration(
+                {"http_pool_maxsize": 4}, threads=16
+            ) as downloader:
+                adapter = downloader.session.get_adapter("https://api.worldbank.org/")
+                assert adapter._pool_maxsize == 16
+            with PooledDownload.from_configuration(
+                {"json_backend": "json"}
+            ) as downloader:
+                assert downloader.download(path).json() == [
+                    {"page": 1},
+                    [{"id": "AFG"}],
+                ]
@@ -0,0 +1,66 @@
+#!/usr/bin/python
+"""
+Unit tests for sharding.
+
+"""
+
+import pytest
+
+from hdx.scraper.worldbank.sharding import get_shard
+
+
+class TestSharding:
+    countries = [
+        {"iso3": iso3}
+        for iso3 in ("AFG", "BRA", "CHN", "DZA", "EGY", "FRA", "GBR", "IND", "USA")
+    ]
+
+    def test_hash_shard(self):
+        assert get_shard(self.countries, 1, 0) == self.countries
+        shards = [get_shard(self.countries, 3, i) for i in range(3)]
+        assert sorted(x["iso3"] for shard in shards for x in shard) == [
+            x["iso3"] for x in self.countries
+        ]
+        for shard in shards:
+            assert shard == [x for x in self.countries if x in shard]
+        assert shards == [get_shard(self.countries, 3, i) for i in range(3)]
+        assert [[x["iso3"] for x in shard] for shard in shards] == [
+            ["DZA", "GBR"],
+            ["AFG", "BRA", "EGY", "FRA", "USA"],
+            ["CHN", "IND"],
+        ]
+
+    def test_balanced_shard(self):
+        costs = {"USA": 10, "CHN": 9, "IND": 8, "BRA": 3, "AFG": 1}
+        shards = [
+            get_shard(self.countries, 3, i, method="balanced", costs=costs)
+            for i in range(3)
+        ]
+        assert [[x["iso3"] for x in shard] for shard in shards] == [
+            ["AFG", "FRA", "USA"],
+            ["BRA", "CHN", "EGY"],
+            ["DZA", "GBR", "IND"],
+        ]
+
+    def test_balanced_shard_different_costs(self):
+        # Costs that differ between machines, such as each machine's own
+        # timings, give partitions that overlap and miss countries
+        costs = (
+            {"USA": 10, "CHN": 9, "IND": 8, "BRA": 3, "AFG": 1},
+            {"USA": 1, "CHN": 2, "IND": 3, "BRA": 9, "AFG": 10},
+        )
+        shards = [
+            {x["iso3"] for x in get_shard(self.countries, 2, i, "balanced", costs[i])}
+            for i in range(2)
+        ]
+        assert shards[0] & shards[1] == {"DZA"}
+        assert {x["iso3"] for x in self.countries} - (shards[0] | shards[1]) == {
+            "AFG",
+            "CHN",
+        }
+
+    def test_bad_shard(self):
+        with pytest.raises(ValueError):
+            get_shard(self.countries, 3, 3)
+        with pytest.raises(ValueError):
+            get_shard(self.countries, 3, 0, method="random")
@@ -0,0 +1,63 @@
+#!/usr/bin/python
+"""
+Unit tests for staging.
+
+"""
+
+from os.path import join
+
+from hdx.utilities.path import temp_dir
+
+from tests.countries_data import CountriesData
+from tests.other_data import OtherData
+from tests.topics_data import TopicsData
+
+from hdx.scraper.worldbank.pipeline import generate_dataset_and_showcase
+from hdx.scraper.worldbank.staging import Stager, load_manifest, load_staged
+
+
+class TestStaging:
+    def test_stage_and_load(self, configuration, downloader):
+        with temp_dir("worldbank-staging") as folder:
+            country = CountriesData.country
+            dataset, showcase, qc_indicators, _, _ = generate_dataset_and_showcase(
+                configuration,
+                downloader,
+                join(folder, "AFG"),
+                country,
+                TopicsData.topics[0],
+            )
+            stager = Stager(folder)
+            filename = stager.stage(
+                "AFG", dataset, showcase, "test", indicators=qc_indicators
+            )
+            assert filename == (
+                "world-bank-gender-and-science-indicators-for-afghanistan.json"
+            )
+            manifest = stager.save_manifest(["topline", "AFG", "ZZZ"])
+            assert manifest == [
+                {
+                    "key": "AFG",
+                    "entries": [{"name": dataset["name"], "filename": filename}],
+                }
+            ]
+            assert load_manifest(folder) == manifest
+
+            (
+                staged_dataset,
+                staged_showcase,
+                quickcharts,
+                updated_by_script,
+            ) = load_staged(folder, filename)
+            assert staged_dataset == dataset
+            assert staged_dataset.get_resources() == dataset.get_resources()
+            assert [x.get_file_to_upload() for x in staged_dataset.get_resources()] == [
+                join(folder, "AFG", "gender-and-science_AFG.csv"),
+                join(folder, "AFG", "qc_gender-and-science_AFG.csv"),
+            ]
+            assert staged_showcase == showcase
+            assert quickcharts == {
+                "bites_disabled": None,
+                "indicators": OtherData.qc_indicators,
+            }
+            assert updated_by_script == "test"
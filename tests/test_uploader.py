@@ -0,0 +1,47 @@
+#!/usr/bin/python
+"""
+Unit tests for uploader.
+
+"""
+
+import pytest
+from hdx.data.hdxobject import HDXError
+
+from hdx.scraper.worldbank.uploader import Uploader
+
+
+class TestUploader:
+    def test_upload(self):
+        calls = []
+        failures = []
+
+        def flaky_step():
+            if not failures:
+                failures.append(1)
+                raise HDXError("Temporary failure")
+            calls.append("showcase")
+
+        with Uploader(max_workers=2, calls_per_second=1000, retry_wait=0) as uploader:
+            for name in ("a", "b", "c"):
+                uploader.submit(
+                    name,
+                    lambda name=name: calls.append(name),
+                    flaky_step if name == "a" else lambda: calls.append("showcase"),
+                    lambda name=name: calls.append(f"link {name}"),
+                )
+            uploader.wait()
+            assert sorted(uploader.latencies) == ["a", "b", "c"]
+        assert len(calls) == 9
+        for name in ("a", "b", "c"):
+            assert calls.index(name) < calls.index(f"link {name}")
+        assert failures == [1]
+
+    def test_wait_raises(self):
+        def failing_step():
+            raise HDXError("Permanent failure")
+
+        with Uploader(max_workers=1, retries=2, retry_wait=0) as uploader:
+            uploader.submit("a", failing_step)
+            with pytest.raises(HDXError):
+                uploader.wait()
+            uploader.wait()
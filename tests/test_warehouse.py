@@ -0,0 +1,122 @@
+#!/usr/bin/python
+"""
+Unit tests for warehouse.
+
+"""
+
+from os.path import join
+
+import pytest
+from hdx.utilities.compare import assert_files_same
+from hdx.utilities.path import temp_dir
+from slugify import slugify
+
+from tests.countries_data import CountriesData
+from tests.topics_data import TopicsData
+
+from hdx.scraper.worldbank.pipeline import generate_dataset_and_showcase
+from hdx.scraper.worldbank.warehouse import Warehouse
+
+
+def get_observation(code, year, value):
+    return {
+        "indicator": {"id": code, "value": f"Indicator {code}"},
+        "countryiso3code": "AFG",
+        "date": str(year),
+        "value": value,
+    }
+
+
+class NoDownload:
+    def download(self, url):
+        raise AssertionError(f"Unexpected request for {url}")
+
+
+class TestWarehouse:
+    def test_observations(self):
+        with temp_dir("TestWarehouse", delete_on_success=True) as folder:
+            with Warehouse(join(folder, "warehouse.sqlite")) as warehouse:
+                warehouse.save_observations(
+                    "AFG",
+                    ["A", "B", "C"],
+                    [
+                        get_observation("A", 2019, 1.5),
+                        get_observation("A", 2020, 2),
+                        get_observation("B", 2020, None),
+                        get_observation("C", 2018, 3),
+                    ],
+                )
+                warehouse.save_observations(
+                    "BRA", ["A"], [get_observation("A", 2021, 4)]
+                )
+                observations = warehouse.get_observations("AFG", ["C", "A", "B"])
+                assert [(x["indicator"]["id"], x["date"]) for x in observations] == [
+                    ("C", "2018"),
+                    ("A", "2020"),
+                    ("A", "2019"),
+                ]
+                # Integers and floats are kept as they were
+                assert [x["value"] for x in observations] == [3, 2, 1.5]
+                assert observations[1]["indicator"]["value"] == "Indicator A"
+
+                # A new fetch replaces the observations of its indicators
+                warehouse.save_observations(
+                    "AFG", ["A"], [get_observation("A", 2021, 5)]
+                )
+                observations = warehouse.get_observations("AFG", ["A", "C"])
+                assert [x["date"] for x in observations] == ["2021", "2018"]
+
+                latest_rows = warehouse.get_latest_rows({"AFG", "BRA"}, ["A", "C"])
+                assert latest_rows["AFG"]["A"]["Value"] == 5
+                assert latest_rows["AFG"]["C"]["Year"] == 2018
+                assert latest_rows["BRA"] == {
+                    "A": {
+                        "Country ISO3": "BRA",
+                        "Year": 2021,
+                        "Indicator Name": "Indicator A",
+                        "Indicator Code": "A",
+                        "Value": 4,
+                    }
+                }
+                assert warehouse.get_latest_rows({"AFG"}, ["A"]).keys() == {"AFG"}
+
+    def test_catalog(self):
+        with temp_dir("TestWarehouse", delete_on_success=True) as folder:
+            with Warehouse(join(folder, "warehouse.sqlite")) as warehouse:
+                with pytest.raises(ValueError):
+                    warehouse.get_catalog("topics")
+                warehouse.save_catalog("topics", TopicsData.topics)
+                assert warehouse.get_catalog("topics") == TopicsData.topics
+
+    def test_generate_offline(self, configuration, downloader):
+        topic = TopicsData.topics[0]
+        country = CountriesData.country
+        filename = f"{slugify(topic['value'])}_{country['iso3']}.csv"
+        with temp_dir("TestWarehouse", delete_on_success=True) as folder:
+            path = join(folder, "warehouse.sqlite")
+            with Warehouse(path) as warehouse:
+                generate_dataset_and_showcase(
+                    configuration,
+                    downloader,
+                    folder,
+                    country,
+                    topic,
+                    warehouse=warehouse,
+                )
+            with Warehouse(path, offline=True) as warehouse:
+                offline_folder = join(folder, "offline")
+                dataset, _, _, _, _ = generate_dataset_and_showcase(
+                    configuration,
+                    NoDownload(),
+                    offline_folder,
+                    country,
+                    topic,
+                    warehouse=warehouse,
+                )
+            assert (
+                dataset["name"]
+                == "world-bank-gender-and-science-indicators-for-afghanistan"
+            )
+            assert_files_same(
+                join("tests", "fixtures", filename), join(offline_folder, filename)
+            )
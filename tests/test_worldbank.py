@@ -7,6 +7,7 @@ Unit tests for worldbank.
 from os.path import join
 
 import pytest
+from hdx.data.showcase import Showcase
 from hdx.utilities.compare import assert_files_same
 from hdx.utilities.path import temp_dir
 from slugify import slugify
@@ -16,13 +17,18 @@ from tests.other_data import OtherData
 from tests.topics_data import TopicsData
 
 from hdx.scraper.worldbank.pipeline import (
+    add_tags,
     generate_all_datasets_showcases,
     generate_combined_dataset_and_showcase,
     generate_dataset_and_showcase,
     generate_topline_dataset,
     get_countries,
+    get_dataset,
+    get_hdx_location,
+    get_indicator_batches,
     get_topics,
     get_unit,
+    get_valid_countries,
 )
 
 
@@ -68,8 +74,10 @@ class TestWorldBank:
     ]
 
     def test_get_topics(self, downloader):
-        topics = get_topics("http://lala/", downloader)
+        lastupdated = {}
+        topics = get_topics("http://lala/", downloader, lastupdated)
         assert topics == TopicsData.topics
+        assert lastupdated == {"2": "2019-09-27"}
 
     def test_get_countries(self, downloader):
         countries = get_countries("http://haha/", downloader)
@@ -159,6 +167,36 @@ class TestWorldBank:
         )
         assert get_unit("Number of deaths ages 5-14 years") == "deaths ages 5-14 years"
 
+    def test_get_valid_countries(self, configuration):
+        countries = [CountriesData.country, {"name": "Nowhere", "iso3": "YYZ"}]
+        assert get_valid_countries(countries) == [CountriesData.country]
+        assert get_hdx_location("AFG") == ("afg", None)
+        hdx_code, error = get_hdx_location("YYZ")
+        assert hdx_code is None
+        assert "YYZ" in error
+
+    def test_add_tags(self, configuration):
+        dataset = get_dataset("test", "Test")
+        assert dataset["data_update_frequency"] == "30"
+        add_tags(dataset, ["hxl", "indicators"])
+        showcase = Showcase({"name": "test-showcase"})
+        add_tags(showcase, ["hxl", "indicators"])
+        assert showcase.get_tags() == ["hxl", "indicators"]
+        assert dataset["tags"] == showcase["tags"]
+        assert dataset["tags"] is not showcase["tags"]
+        add_tags(dataset, ["gender"])
+        assert dataset.get_tags() == ["hxl", "indicators", "gender"]
+        assert showcase.get_tags() == ["hxl", "indicators"]
+
+    def test_get_indicator_batches(self):
+        indicators = [{"id": f"IND.{i:02d}"} for i in range(10)]
+        batches = get_indicator_batches(indicators, 4, 1000)
+        assert [len(x) for x in batches] == [4, 4, 2]
+        batches = get_indicator_batches(indicators, 4, 20)
+        assert [len(x) for x in batches] == [3, 3, 3, 1]
+        assert [x for batch in batches for x in batch] == indicators
+        assert get_indicator_batches(indicators, 4, 5) == [[x] for x in indicators]
+
     def test_generate_dataset_and_showcase(self, configuration, downloader):
         with temp_dir("worldbank") as folder:
             topic = TopicsData.topics[0]
@@ -366,6 +404,38 @@ class TestWorldBank:
                     "1234",
                 )
 
+    def test_generate_all_datasets_showcases_in_parallel(
+        self, configuration, downloader
+    ):
+        created = []
+
+        def create_dataset_showcase(dataset, showcase, qc_indicators, batch):
+            created.append(dataset["name"])
+
+        configuration["topic_workers"] = 4
+        try:
+            with temp_dir("worldbank") as folder:
+                dataset, _, _ = generate_all_datasets_showcases(
+                    configuration,
+                    downloader,
+                    folder,
+                    CountriesData.country,
+                    TopicsData.topics[:4],
+                    create_dataset_showcase,
+                    "1234",
+                )
+                filename = f"indicators_{CountriesData.country['iso3']}.csv"
+                expected_file = join("tests", "fixtures", filename)
+                actual_file = join(folder, filename)
+                assert_files_same(expected_file, actual_file)
+        finally:
+            del configuration["topic_workers"]
+        assert created == [
+            "world-bank-gender-and-science-indicators-for-afghanistan",
+            "world-bank-health-indicators-for-afghanistan",
+        ]
+        assert dataset["name"] == "world-bank-combined-indicators-for-afghanistan"
+
     def test_generate_topline_dataset(self, configuration, downloader):
         with temp_dir("worldbank") as folder:
             countries = [CountriesData.country, {"iso3": "YYZ"}]
@@ -406,3 +476,51 @@ class TestWorldBank:
                 _ = generate_topline_dataset(
                     "http://haha/", downloader, folder, countries, topline_indicators
                 )
+
+    def test_generate_topline_dataset_from_rows(self, configuration, downloader):
+        def create_dataset_showcase(dataset, showcase, qc_indicators, batch):
+            pass
+
+        with temp_dir("worldbank") as folder:
+            topline = {}
+            generate_all_datasets_showcases(
+                configuration,
+                downloader,
+                folder,
+                CountriesData.country,
+                TopicsData.topics[:4],
+                create_dataset_showcase,
+                "1234",
+                topline=topline,
+            )
+            assert list(topline) == ["AFG"]
+            assert list(topline["AFG"]) == ["SP.POP.TOTL"]
+            countries = [CountriesData.country, {"iso3": "YYZ"}]
+            dataset = generate_topline_dataset(
+                "http://notused/",
+                downloader,
+                folder,
+                countries,
+                configuration["topline_indicators"],
+                topline,
+            )
+            assert dataset["groups"] == [{"name": "afg"}]
+            assert dataset["dataset_date"] == (
+                "[2018-01-01T00:00:00 TO 2018-12-31T23:59:59]"
+            )
+            # url column refers to the equivalent World Bank API request
+            filename = "worldbank_topline.csv"
+            with open(join("tests", "fixtures", filename)) as f:
+                expected = f.read().replace("http://papa/", "http://notused/")
+            with open(join(folder, filename)) as f:
+                assert f.read() == expected
+
+            with pytest.raises(ValueError):
+                _ = generate_topline_dataset(
+                    "http://notused/",
+                    downloader,
+                    folder,
+                    countries,
+                    configuration["topline_indicators"],
+                    {},
+                )
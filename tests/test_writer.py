@@ -0,0 +1,143 @@
+#!/usr/bin/python
+"""
+Unit tests for writer.
+
+"""
+
+from errno import ENOSPC
+from os.path import exists, join
+
+import pytest
+from hdx.data.dataset import Dataset
+from hdx.utilities.path import temp_dir
+
+from hdx.scraper.worldbank import writer
+from hdx.scraper.worldbank.pipeline import headers, hxltags
+from hdx.scraper.worldbank.writer import generate_resources
+
+
+class TestWriter:
+    quickcharts = {
+        "hashtag": "#indicator+code",
+        "values": ["A", "B", "C"],
+        "numeric_hashtag": "#indicator+value+num",
+        "cutdown": 2,
+        "cutdownhashtags": ["#indicator+code", "#country+code", "#date+year"],
+    }
+
+    @staticmethod
+    def get_rows():
+        values = [638, 68.957, 0.1 + 0.2, 1e-05, 1.5e20, None, "n/a", 37172386]
+        names = ["Name, with comma", 'Name "quoted"', "Name\\nnewline", "Ünïcode"]
+        rows = []
+        for i in range(40):
+            rows.append(
+                {
+                    "Country Name": "Afghanistan",
+                    "Country ISO3": "AFG",
+                    "Year": 2000 + i,
+                    "Indicator Name": names[i % len(names)],
+                    "Indicator Code": "ABCD"[i % 4],
+                    "Value": values[i % len(values)],
+                }
+            )
+        return rows
+
+    def test_generate_resources(self, configuration):
+        resourcedata = {"name": "Test", "description": "Test description"}
+        with temp_dir("TestWriter", delete_on_success=True) as folder:
+            expected_folder = join(folder, "expected")
+            expected_dataset = Dataset({"name": "test"})
+            expected_success, expected_results = (
+                expected_dataset.generate_resource_from_iterable(
+                    headers,
+                    self.get_rows(),
+                    hxltags,
+                    expected_folder,
+                    "test.csv",
+                    resourcedata,
+                    quickcharts=self.quickcharts,
+                )
+            )
+            dataset = Dataset({"name": "test"})
+            success, results = generate_resources(
+                dataset,
+                headers,
+                self.get_rows(),
+                hxltags,
+                folder,
+                "test.csv",
+                resourcedata,
+                self.quickcharts,
+            )
+            assert success is expected_success is True
+            assert sorted(results) == sorted(expected_results)
+            for key in ("headers", "rows", "bites_disabled", "qcheaders", "qcrows"):
+                assert results[key] == expected_results[key]
+            assert dataset.get_resources() == expected_dataset.get_resources()
+            for filename in ("test.csv", "qc_test.csv"):
+                with open(join(folder, filename), "rb") as f:
+                    actual = f.read()
+                with open(join(expected_folder, filename), "rb") as f:
+                    assert actual == f.read()
+
+            success, results = generate_resources(
+                dataset,
+                headers,
+                [],
+                hxltags,
+                folder,
+                "empty.csv",
+                resourcedata,
+                self.quickcharts,
+            )
+            assert success is False
+            assert results == {}
+            assert not exists(join(folder, "empty.csv"))
+
+    def test_no_space(self, monkeypatch, configuration):
+        resourcedata = {"name": "Test", "description": "Test description"}
+        with temp_dir("TestWriter", delete_on_success=True) as folder:
+            memory_folder = join(folder, "memory")
+            disk_folder = join(folder, "disk")
+
+            def full_open(path, *args, **kwargs):
+                file = open(path, *args, **kwargs)
+                if path.startswith(memory_folder):
+                    file.close()
+                    raise OSError(ENOSPC, "No space left on device")
+                return file
+
+            monkeypatch.setattr(writer, "open", full_open, raising=False)
+            dataset = Dataset({"name": "test"})
+            success, results = generate_resources(
+                dataset,
+                headers,
+                self.get_rows(),
+                hxltags,
+                memory_folder,
+                "test.csv",
+                resourcedata,
+                self.quickcharts,
+                disk_folder,
+            )
+            assert success is True
+            # Only the files are written again, to disk
+            assert results["resource"].get_file_to_upload() == join(
+                disk_folder, "test.csv"
+            )
+            assert len(dataset.get_resources()) == 2
+            assert not exists(join(memory_folder, "test.csv"))
+            assert exists(join(disk_folder, "qc_test.csv"))
+
+            with pytest.raises(OSError):
+                generate_resources(
+                    Dataset({"name": "test"}),
+                    headers,
+                    self.get_rows(),
+                    hxltags,
+                    memory_folder,
+                    "test.csv",
+                    resourcedata,
+                    self.quickcharts,
+                )